@@ -0,0 +1,131 @@
+import time
+import threading
+from typing import Dict, Optional
+from config import Config
+from models import db, Notification
+
+
+class AlertCoalescer:
+    """
+    Merges device alerts with the same (device, status) into one Notification
+    per window. The first event of a window creates the row and is delivered;
+    later events only bump an in-memory count and may replace the
+    representative image. The count and image are written once, when the
+    window closes.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def _merge_locked(self, key, now: float, image_url: str, confidence) -> Optional[Dict]:
+        window = self.windows.get(key)
+        if not window or now - window['opened'] >= self.window_seconds:
+            return None
+        window['count'] += 1
+        # The most confident capture represents the window
+        if isinstance(confidence, (int, float)) and (window['confidence'] is None or confidence > window['confidence']):
+            window['confidence'] = confidence
+            window['image_url'] = image_url
+        return dict(window)
+
+    def merge(self, device_id, status: str, image_url: str, confidence=None) -> Optional[Dict]:
+        """Fold the event into an open window and return its state, or None if there is none"""
+        if self.window_seconds <= 0:
+            return None
+        with self.lock:
+            return self._merge_locked((str(device_id), status), time.monotonic(), image_url, confidence)
+
+    def open(self, device_id, status: str, notification_id, image_url: str, confidence=None) -> Optional[Dict]:
+        """
+        Open a window owned by notification_id and return None, or, if a
+        concurrent request opened one first, merge into it and return its state.
+        """
+        if self.window_seconds <= 0:
+            return None
+        key = (str(device_id), status)
+        now = time.monotonic()
+        with self.lock:
+            merged = self._merge_locked(key, now, image_url, confidence)
+            if merged:
+                return merged
+            self.windows[key] = {
+                'notification_id': notification_id,
+                'opened': now,
+                'count': 1,
+                'image_url': image_url,
+                'confidence': confidence if isinstance(confidence, (int, float)) else None
+            }
+        return None
+
+    def release(self, device_id, status: str, notification_id):
+        """Drop a window whose notification could not be stored"""
+        key = (str(device_id), status)
+        with self.lock:
+            window = self.windows.get(key)
+            if window and window['notification_id'] == notification_id:
+                del self.windows[key]
+
+    def schedule_flush(self, app, device_id, status: str, notification_id):
+        """Write the window's merged count once it closes"""
+        key = (str(device_id), status)
+        with self.lock:
+            window = self.windows.get(key)
+            if not window or window['notification_id'] != notification_id:
+                return
+        timer = threading.Timer(self.window_seconds, self.flush, args=(app, key, window))
+        timer.daemon = True
+        timer.start()
+
+    def flush(self, app, key, window: Dict):
+        with self.lock:
+            # A later window may already have replaced this one under the same key
+            if self.windows.get(key) is window:
+                del self.windows[key]
+            window = dict(window)
+        if window['count'] <= 1:
+            return
+        try:
+            with app.app_context():
+                Notification.query.filter_by(id=window['notification_id']).update({
+                    'event_count': window['count'],
+                    'image_path': window['image_url'],
+                    'confidence': window['confidence']
+                }, synchronize_session=False)
+                db.session.commit()
+        except Exception as e:
+            print(f"[ERROR] Failed to store coalesced count for notification {window['notification_id']}: {e}")
+            with app.app_context():
+                db.session.rollback()
+
+
+class SendBudget:
+    """Token bucket per (user, channel): up to limit sends, refilled evenly over an hour"""
+
+    def __init__(self, limits_per_hour: Dict[str, int]):
+        self.limits = limits_per_hour
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def allow(self, user_id, channel: str) -> bool:
+        limit = self.limits.get(channel)
+        if not limit or limit <= 0:
+            return True
+        key = (str(user_id), channel)
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (float(limit), now))
+            tokens = min(float(limit), tokens + (now - updated) * limit / 3600.0)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now)
+                return False
+            self.buckets[key] = (tokens - 1, now)
+            return True
+
+
+coalescer = AlertCoalescer(Config.NOTIFY_COALESCE_SECONDS)
+send_budget = SendBudget({
+    'email': Config.NOTIFY_EMAIL_BUDGET_PER_HOUR,
+    'whatsapp': Config.NOTIFY_WHATSAPP_BUDGET_PER_HOUR
+})
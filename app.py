@@ -13,8 +13,11 @@ from datetime import datetime
 from models import db
 from flask_cors import CORS
 from flask_migrate import Migrate
+from streaming import SpoolingRequest
+from notification_outbox import start_outbox_drainer
 
 app = Flask(__name__)
+app.request_class = SpoolingRequest
 app.config.from_object(Config)
 
 db.init_app(app)
@@ -62,4 +65,7 @@ with app.app_context():
     db.create_all()
 
 if __name__ == '__main__':
+    # Only server entry points drain the outbox, not imports by flask db and other CLI commands
+    if Config.OUTBOX_DRAIN_IN_PROCESS:
+        start_outbox_drainer(app)
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
@@ -1,49 +1,113 @@
-from flask import Blueprint, json, request, jsonify
+from flask import Blueprint, Response, json, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import base64
+import binascii
 import uuid
 from datetime import datetime
-from supabase_client import upload_captured_face
+from config import Config
+from models import db, Device, CapturedImage
+from supabase_client import upload_captured_face, iter_bucket_files, build_public_url
+from pagination import encode_cursor, decode_cursor, parse_page_size, parse_datetime
+from perceptual_hash import dhash, find_similar_capture, remember_capture
+from thumbnails import THUMB_BUCKETS, THUMB_FORMATS, get_thumbnail
+from streaming import spool_stream, file_size, read_all
 
 images_bp = Blueprint('images', __name__)
 
+def store_captured_image(device_id, person_name, status, image_bytes, filename):
+    """
+    Upload a captured face unless a near-identical capture of the same person
+    and status was stored for this device recently; in that case the earlier
+    object is returned as a reference and nothing is uploaded.
+    image_bytes may be bytes or a seekable file, which is streamed to storage.
+    """
+    image_hash = None
+    if Config.PHASH_ENABLED:
+        # dHash needs the decoded image, so the file is read in full only here
+        image_hash = dhash(image_bytes if isinstance(image_bytes, bytes) else read_all(image_bytes))
+    if image_hash is not None:
+        previous = find_similar_capture(device_id, image_hash, person_name, status)
+        if previous:
+            return dict(previous, suppressed=True)
+    
+    upload_result = upload_captured_face(
+        device_id=device_id,
+        person_name=person_name,
+        status=status,
+        file_bytes=image_bytes,
+        filename=filename
+    )
+    
+    if image_hash is not None and upload_result.get('success'):
+        remember_capture(device_id, image_hash, person_name, status, upload_result)
+    return upload_result
+
+def parse_captured_upload():
+    """
+    Read a captured-face upload in any of the supported encodings:
+    - raw image/jpeg body with X-Device-Id, X-Filename, X-Person-Name, X-Status headers
+    - multipart/form-data with an 'image' file and deviceId/filename/personName/status fields
+    - legacy JSON with base64 imageData
+    Returns (fields, image) where image is bytes for JSON uploads and a
+    seekable spooled file otherwise.
+    """
+    if request.mimetype == 'image/jpeg':
+        fields = {
+            'deviceId': request.headers.get('X-Device-Id'),
+            'filename': request.headers.get('X-Filename'),
+            'personName': request.headers.get('X-Person-Name'),
+            'status': request.headers.get('X-Status'),
+            'bucket': request.headers.get('X-Bucket')
+        }
+        spooled, _, size = spool_stream(request.stream)
+        return fields, spooled if size else None
+    
+    if request.mimetype == 'multipart/form-data':
+        file = request.files.get('image')
+        fields = request.form.to_dict()
+        if file and not fields.get('filename'):
+            fields['filename'] = file.filename
+        return fields, file.stream if file else None
+    
+    # Legacy devices: base64 image inside a JSON body
+    data = request.get_json(silent=True) or {}
+    image_data = data.get('imageData')
+    return data, base64.b64decode(image_data) if image_data else None
+
 @images_bp.route('/upload-captured', methods=['POST'])
 def upload_captured_image():
     """Upload captured face image to Supabase captured-faces bucket"""
-    data = request.get_json()
+    try:
+        fields, image_bytes = parse_captured_upload()
+    except (ValueError, binascii.Error):
+        return jsonify({'error': 'Invalid image data'}), 400
     
     # Required fields
-    device_id = data.get('deviceId')
-    image_data = data.get('imageData')
-    filename = data.get('filename')
+    device_id = fields.get('deviceId')
+    filename = fields.get('filename')
     
-    if not all([device_id, image_data, filename]):
+    if not all([device_id, image_bytes, filename]):
         return jsonify({'error': 'Missing required fields'}), 400
     
     try:
-        # Decode base64 image
-        image_bytes = base64.b64decode(image_data)
-        
         # Get additional data
-        person_name = data.get('personName', 'Unknown')
-        status = data.get('status', 'unrecognized')
-        bucket = data.get('bucket', 'captured-faces')
+        person_name = fields.get('personName') or 'Unknown'
+        status = fields.get('status') or 'unrecognized'
+        bucket = fields.get('bucket') or 'captured-faces'
         
         # Upload to Supabase
-        upload_result = upload_captured_face(
-            device_id=device_id,
-            person_name=person_name,
-            status=status,
-            file_bytes=image_bytes,
-            filename=filename
-        )
+        upload_result = store_captured_image(device_id, person_name, status, image_bytes, filename)
         
         if upload_result.get('success'):
+            size = len(image_bytes) if isinstance(image_bytes, bytes) else file_size(image_bytes)
+            record_captured_image(device_id, person_name, status, filename, upload_result, size)
             return jsonify({
                 'message': 'Image uploaded successfully',
                 'url': upload_result.get('public_url') or upload_result.get('signed_url', ''),
                 'path': upload_result.get('path'),
-                'bucket': bucket
+                'bucket': bucket,
+                'deduplicated': upload_result.get('deduplicated', False),
+                'suppressed': upload_result.get('suppressed', False)
             }), 200
         else:
             return jsonify({'error': 'Failed to upload to Supabase'}), 500
@@ -52,16 +116,138 @@ def upload_captured_image():
         print(f"[ERROR] Failed to upload captured image: {e}")
         return jsonify({'error': str(e)}), 500
 
+def record_captured_image(device_id, person_name, status, filename, upload_result, size):
+    """Add the capture to the CapturedImage catalog; failures never fail the upload"""
+    try:
+        device_uuid = uuid.UUID(str(device_id))
+    except ValueError:
+        print(f"[WARN] Not cataloguing capture for non-UUID device {device_id}")
+        return None
+    
+    try:
+        image = CapturedImage(
+            id=uuid.uuid4(),
+            device_id=device_uuid,
+            person_name=person_name[:100],
+            status=status[:20],
+            filename=filename[:255],
+            supabase_path=upload_result.get('path'),
+            content_hash=upload_result.get('content_hash'),
+            size=size,
+            is_reference=bool(upload_result.get('suppressed') or upload_result.get('deduplicated')),
+            created_at=datetime.utcnow()
+        )
+        db.session.add(image)
+        db.session.commit()
+        return image
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to catalog captured image: {e}")
+        return None
+
+def serialize_captured_image(image):
+    return {
+        'id': str(image.id),
+        'filename': image.filename,
+        'path': image.supabase_path,
+        'url': build_public_url('captured-faces', image.supabase_path),
+        'person_name': image.person_name,
+        'status': image.status,
+        'timestamp': image.created_at.isoformat() if image.created_at else None,
+        'size': image.size,
+        'is_reference': bool(image.is_reference),
+        'created_at': image.created_at.isoformat() if image.created_at else None
+    }
+
+def list_captured_from_storage(device_id):
+    """Captured images parsed from the storage listing (captures made before the catalog existed)"""
+    images = []
+    # Stream the listing page by page instead of one capped list() call
+    for file_info in iter_bucket_files('captured-faces', str(device_id), prefetch=True):
+        if not file_info.get('name'):
+            continue
+        # Parse filename for metadata
+        filename = file_info['name'].split('/')[-1] if '/' in file_info['name'] else file_info['name']
+        parts = filename.replace('.jpg', '').split('_')
+        
+        person_name = "Unknown"
+        status = "unrecognized"
+        timestamp = ""
+        
+        if len(parts) >= 3:
+            person_name = parts[0].replace('_', ' ')
+            status = parts[1]
+            timestamp = parts[2] if len(parts) > 2 else ""
+        
+        images.append({
+            'filename': filename,
+            'path': file_info['name'],
+            'person_name': person_name,
+            'status': status,
+            'timestamp': timestamp,
+            'size': (file_info.get('metadata') or {}).get('size'),
+            'created_at': file_info.get('created_at')
+        })
+    return images
+
+def backfill_captured_catalog(device_id) -> int:
+    """
+    Add CapturedImage rows for captures that are in storage but not in the
+    catalog, i.e. those stored before it existed. Returns the rows added.
+    """
+    known = {
+        path for (path,) in CapturedImage.query.filter(
+            CapturedImage.device_id == device_id
+        ).with_entities(CapturedImage.supabase_path)
+    }
+    rows = []
+    for image in list_captured_from_storage(device_id):
+        path = image['path'] if image['path'].startswith(f"{device_id}/") else f"{device_id}/{image['path']}"
+        if path in known:
+            continue
+        known.add(path)
+        created_at = parse_datetime((image.get('created_at') or '').replace('Z', '+00:00'))
+        rows.append(CapturedImage(
+            id=uuid.uuid4(),
+            device_id=device_id,
+            person_name=image['person_name'][:100],
+            status=image['status'][:20],
+            filename=image['filename'][:255],
+            supabase_path=path,
+            size=image.get('size'),
+            is_reference=False,
+            created_at=created_at or datetime.utcnow()
+        ))
+    if rows:
+        db.session.add_all(rows)
+        db.session.commit()
+    return len(rows)
+
+@images_bp.cli.command('backfill-captured')
+def backfill_captured_command():
+    """Catalog pre-existing captures of every device: flask images backfill-captured"""
+    total = 0
+    for (device_id,) in Device.query.with_entities(Device.id):
+        try:
+            total += backfill_captured_catalog(device_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"[ERROR] Backfill failed for device {device_id}: {e}")
+    print(f"[INFO] Backfilled {total} captured image(s)")
+
 @images_bp.route('/captured/<device_id>', methods=['GET'])
 @jwt_required()
 def get_captured_images(device_id):
-    """Get captured images for a device"""
+    """
+    Get captured images for a device, newest first.
+    Query params: limit, cursor, status, person, since, until (ISO 8601).
+    source=storage lists the bucket instead of the catalog.
+    """
     user_identity_raw = get_jwt_identity()
     user_identity = json.loads(user_identity_raw)
     user_id = user_identity['id']
     
     # Verify user owns the device
-    from models import Device
     try:
         device_id = uuid.UUID(device_id)
     except ValueError:
@@ -71,39 +257,106 @@ def get_captured_images(device_id):
     if not device:
         return jsonify({'error': 'Device not found or unauthorized'}), 404
     
-    # Get images from Supabase
-    from supabase_client import list_files_in_bucket
-    files = list_files_in_bucket('captured-faces', device_id)
+    if request.args.get('source') == 'storage':
+        try:
+            images = list_captured_from_storage(device_id)
+        except Exception as e:
+            print(f"[ERROR] Failed to list files: {e}")
+            return jsonify({'error': 'Failed to list captured images'}), 502
+        
+        return jsonify({
+            'device_id': device_id,
+            'device_name': device.name,
+            'images': images,
+            'count': len(images)
+        }), 200
     
-    images = []
-    for file_info in files:
-        if file_info.get('name'):
-            # Parse filename for metadata
-            filename = file_info['name'].split('/')[-1] if '/' in file_info['name'] else file_info['name']
-            parts = filename.replace('.jpg', '').split('_')
-            
-            person_name = "Unknown"
-            status = "unrecognized"
-            timestamp = ""
-            
-            if len(parts) >= 3:
-                person_name = parts[0].replace('_', ' ')
-                status = parts[1]
-                timestamp = parts[2] if len(parts) > 2 else ""
-            
-            images.append({
-                'filename': filename,
-                'path': file_info['name'],
-                'person_name': person_name,
-                'status': status,
-                'timestamp': timestamp,
-                'size': file_info.get('metadata', {}).get('size'),
-                'created_at': file_info.get('created_at')
-            })
+    limit = parse_page_size(request.args.get('limit'))
+    query = CapturedImage.query.filter(CapturedImage.device_id == device_id)
+    
+    if request.args.get('status'):
+        query = query.filter(CapturedImage.status == request.args['status'])
+    if request.args.get('person'):
+        query = query.filter(CapturedImage.person_name == request.args['person'])
+    
+    since = parse_datetime(request.args.get('since'))
+    until = parse_datetime(request.args.get('until'))
+    if request.args.get('since') and not since:
+        return jsonify({'error': 'since must be an ISO 8601 datetime'}), 400
+    if request.args.get('until') and not until:
+        return jsonify({'error': 'until must be an ISO 8601 datetime'}), 400
+    if since:
+        query = query.filter(CapturedImage.created_at >= since)
+    if until:
+        query = query.filter(CapturedImage.created_at < until)
+    
+    if request.args.get('cursor'):
+        cursor = decode_cursor(request.args['cursor'])
+        if not cursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(
+            db.tuple_(CapturedImage.created_at, CapturedImage.id) < cursor
+        )
+    
+    # Served by ix_captured_image_device_created
+    rows = query.order_by(
+        CapturedImage.created_at.desc(),
+        CapturedImage.id.desc()
+    ).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
     
     return jsonify({
         'device_id': device_id,
         'device_name': device.name,
-        'images': images,
-        'count': len(images)
-    }), 200
\ No newline at end of file
+        'images': [serialize_captured_image(image) for image in rows],
+        'count': len(rows),
+        'next_cursor': next_cursor
+    }), 200
+
+@images_bp.route('/thumb', methods=['GET'])
+@jwt_required()
+def get_image_thumbnail():
+    """
+    Resized variant of a storage image of one of the user's devices.
+    Query params: bucket (images|captured-faces), path (starting with the
+    device id), w (snapped to 64/128/256/512), fmt (webp|jpeg).
+    """
+    bucket = request.args.get('bucket', 'images')
+    path = request.args.get('path', '')
+    fmt = request.args.get('fmt', 'webp')
+    
+    if bucket not in THUMB_BUCKETS:
+        return jsonify({'error': 'Invalid bucket'}), 400
+    if not path or '..' in path.split('/'):
+        return jsonify({'error': 'Invalid path'}), 400
+    if fmt not in THUMB_FORMATS:
+        return jsonify({'error': 'fmt must be webp or jpeg'}), 400
+    try:
+        width = int(request.args.get('w', 256))
+    except ValueError:
+        return jsonify({'error': 'w must be an integer'}), 400
+    if width <= 0:
+        return jsonify({'error': 'w must be positive'}), 400
+    
+    # Both buckets keep a device's objects under its id
+    user_id = json.loads(get_jwt_identity())['id']
+    try:
+        device_id = uuid.UUID(path.split('/', 1)[0])
+    except ValueError:
+        return jsonify({'error': 'Image not found'}), 404
+    if not Device.query.filter_by(id=device_id, owner_id=uuid.UUID(user_id)).first():
+        return jsonify({'error': 'Image not found'}), 404
+    
+    thumb = get_thumbnail(bucket, path, width, fmt)
+    if thumb is None:
+        return jsonify({'error': 'Image not found'}), 404
+    
+    data, mimetype, etag = thumb
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = Config.THUMB_MAX_AGE
+    return response.make_conditional(request)
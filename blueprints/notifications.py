@@ -1,19 +1,25 @@
 import json
 import uuid
-from flask import Blueprint, Response, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app
 import numpy as np
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from config import Config
 import requests
 from datetime import datetime
-import maileroo
 import os
 from models import Device, User, db, Notification
-try:
-    from notifications_service import send_email as sg_send_email, send_whatsapp
-except Exception:
-    sg_send_email = None
-    send_whatsapp = None
+from notification_dispatcher import dispatcher
+from notification_outbox import add_to_outbox, wake_drainer
+from alert_throttle import coalescer, send_budget
+from pagination import encode_cursor, decode_cursor, parse_page_size, parse_datetime
+from notifications_service import (
+    HTTP_TIMEOUT,
+    get_http_session,
+    send_email as sg_send_email,
+    send_maileroo_email,
+    send_whatsapp,
+    whatsapp_configured
+)
 
 notifications_bp = Blueprint('notifications', __name__)
 
@@ -52,7 +58,7 @@ def send_email_notification(user_email: str, device_name: str, person_name: str,
     if isinstance(confidence, (list, np.ndarray)):
         confidence_value = float(np.mean(confidence))
     else:
-        confidence_value = float(confidence)
+        confidence_value = float(confidence) if confidence is not None else None
     
     if status == "recognized":
         subject = f"✅ Door Access: {person_name} Recognized"
@@ -89,14 +95,7 @@ def send_email_notification(user_email: str, device_name: str, person_name: str,
     
     # Fallback to Maileroo
     try:
-        client = maileroo.Maileroo(api_key=Config.MAILERO_API_KEY)
-        email = {
-            'from': Config.MAILERO_SENDER,
-            'to': user_email,
-            'subject': subject,
-            'html': body
-        }
-        client.send_email(email)
+        send_maileroo_email(Config.MAILERO_API_KEY, Config.MAILERO_SENDER, user_email, subject, html=body)
         return True
     except Exception as e:
         print(f"[ERROR] Failed to send email: {e}")
@@ -117,7 +116,7 @@ def send_whatsapp_notification(phone_number: str, device_name: str, person_name:
     if isinstance(confidence, (list, np.ndarray)):
         confidence_value = float(np.mean(confidence))
     else:
-        confidence_value = float(confidence)
+        confidence_value = float(confidence) if confidence is not None else None
     
     if status == "recognized":
         message = f"""
@@ -158,6 +157,10 @@ View image: {image_url}
         print(f"[ERROR] Failed to send WhatsApp: {e}")
         return False
 
+# Deliveries run on background workers; worker counts bound provider concurrency
+dispatcher.register_channel('email', send_email_notification, Config.NOTIFY_EMAIL_CONCURRENCY)
+dispatcher.register_channel('whatsapp', send_whatsapp_notification, Config.NOTIFY_WHATSAPP_CONCURRENCY)
+
 def send_email(to_email, subject, body):
     if not Config.EMAIL_ENABLED:
         print("[INFO] Email notifications disabled")
@@ -170,14 +173,7 @@ def send_email(to_email, subject, body):
         except Exception as e:
             print(f"[WARN] SendGrid send failed: {e}")
     try:
-        client = maileroo.Maileroo(api_key=Config.MAILERO_API_KEY)
-        email = {
-            'from': Config.MAILERO_SENDER,
-            'to': to_email,
-            'subject': subject,
-            'text': body
-        }
-        client.send_email(email)
+        send_maileroo_email(Config.MAILERO_API_KEY, Config.MAILERO_SENDER, to_email, subject, text=body)
         return True
     except Exception as e:
         print(f"[ERROR] Failed to send email: {e}")
@@ -188,7 +184,7 @@ def send_push_notification(message):
         print("[INFO] Push notifications disabled")
         return False
     try:
-        response = requests.post(Config.PUSH_WEBHOOK_URL, json={'message': message})
+        response = get_http_session().post(Config.PUSH_WEBHOOK_URL, json={'message': message}, timeout=HTTP_TIMEOUT)
         return response.status_code == 200
     except Exception as e:
         print(f"[ERROR] Failed to send push notification: {e}")
@@ -211,13 +207,14 @@ def initiate_call():
     }
     try:
         # If Twilio WhatsApp is configured, send a WhatsApp message instead of voice call
-        if os.getenv('TWILIO_ACCOUNT_SID') and send_whatsapp:
+        if whatsapp_configured():
             try:
                 send_whatsapp(Config.OWNER_PHONE_NUMBER, f"Unknown face detected at your door at {datetime.utcnow().isoformat()}")
                 return True, {'method': 'whatsapp'}
             except Exception as e:
                 print(f"[WARN] Twilio WhatsApp failed: {e}")
-        response = requests.post("https://voice.africastalking.com/call", headers=headers, data=payload)
+        response = get_http_session().post("https://voice.africastalking.com/call", headers=headers,
+                                           data=payload, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         return True, response.json()
     except requests.exceptions.RequestException as e:
@@ -245,6 +242,11 @@ def receive_device_notification():
     except ValueError:
         return jsonify({"error": "Invalid device ID format"}), 400
     
+    # Events in a burst join the open notification without touching the database
+    merged = coalescer.merge(device_id, status, image_url, confidence)
+    if merged:
+        return coalesced_response(merged)
+    
     # Get device and owner information
     device = Device.query.filter_by(id=device_id).first()
     if not device:
@@ -254,6 +256,11 @@ def receive_device_notification():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
+    notification_id = uuid.uuid4()
+    merged = coalescer.open(device_id, status, notification_id, image_url, confidence)
+    if merged:
+        return coalesced_response(merged)
+    
     # Extract person name from image URL if recognized
     person_name = "Unknown"
     if status == "recognized":
@@ -261,49 +268,71 @@ def receive_device_notification():
     
     # Create notification record
     notification = Notification(
-        id=uuid.uuid4(),
+        id=notification_id,
         user_id=user.id,
+        device_id=device.id,
         person_name=person_name,
         status=status,
         confidence=confidence,
-        image_url=image_url,
+        image_path=image_url,
         timestamp=datetime.utcnow()
     )
     
     db.session.add(notification)
-    db.session.commit()
-    
-    # Send notifications
-    email_sent = send_email_notification(
-        user.email, 
-        device.name, 
-        person_name, 
-        status, 
-        image_url, 
-        confidence
-    )
     
-    whatsapp_sent = send_whatsapp_notification(
-        user.phone,
-        device.name,
-        person_name,
-        status,
-        image_url,
-        confidence
-    )
+    # Deliveries are committed with the row and sent by the outbox drainer
+    alert = {
+        'device_name': device.name,
+        'person_name': person_name,
+        'status': status,
+        'image_url': image_url,
+        'confidence': confidence
+    }
+    email_queued = bool(Config.EMAIL_ENABLED and user.email and send_budget.allow(user.id, 'email'))
+    if email_queued:
+        add_to_outbox(notification.id, 'email', dict(alert, user_email=user.email))
+    
+    whatsapp_queued = bool(Config.WHATSAPP_ENABLED and user.phone and whatsapp_configured()
+                           and send_budget.allow(user.id, 'whatsapp'))
+    if whatsapp_queued:
+        add_to_outbox(notification.id, 'whatsapp', dict(alert, phone_number=user.phone))
+    
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        coalescer.release(device_id, status, notification_id)
+        raise
+    wake_drainer()
+    coalescer.schedule_flush(current_app._get_current_object(), device_id, status, notification_id)
     
     return jsonify({
-        'message': 'Notification received and processed',
+        'message': 'Notification accepted',
         'notification_id': str(notification.id),
-        'email_sent': email_sent,
-        'whatsapp_sent': whatsapp_sent,
-        'person_name': person_name
-    }), 200
+        'email_queued': email_queued,
+        'whatsapp_queued': whatsapp_queued,
+        'person_name': person_name,
+        'coalesced': False
+    }), 202
+
+def coalesced_response(window):
+    return jsonify({
+        'message': 'Notification coalesced',
+        'notification_id': str(window['notification_id']),
+        'count': window['count'],
+        'email_queued': False,
+        'whatsapp_queued': False,
+        'coalesced': True
+    }), 202
 
 @notifications_bp.route('', methods=['GET'])
 @jwt_required()
 def get_notifications():
-    """Get all notifications for the current user"""
+    """
+    Get notifications for the current user, newest first.
+    Query params: limit, cursor, status, person, since, until (ISO 8601).
+    has_more is true when older notifications remain; pass next_cursor to get them.
+    """
     user_identity_raw = get_jwt_identity()
     user_identity = json.loads(user_identity_raw)
     user_id = user_identity['id']
@@ -313,17 +342,61 @@ def get_notifications():
     except ValueError:
         return jsonify({"error": "Invalid user ID format"}), 400
     
-    notifications = Notification.query.filter_by(user_id=user_id).order_by(Notification.timestamp.desc()).all()
-    
-    return jsonify([{
-        'id': str(n.id),
-        'personName': n.person_name,
-        'timestamp': n.timestamp.isoformat() if n.timestamp else None,
-        'status': n.status,
-        'imageUrl': n.image_url or 'https://placehold.co/400',
-        'confidence': n.confidence * 100 if n.confidence else None,
-        'device': n.device.name if n.device else 'Unknown Device'
-    } for n in notifications]), 200
+    limit = parse_page_size(request.args.get('limit'))
+    # Device names come from the same query instead of a lookup per row
+    query = db.session.query(Notification, Device.name).outerjoin(
+        Device, Notification.device_id == Device.id
+    ).filter(Notification.user_id == user_id)
+    
+    if request.args.get('status'):
+        query = query.filter(Notification.status == request.args['status'])
+    if request.args.get('person'):
+        query = query.filter(Notification.person_name == request.args['person'])
+    
+    since = parse_datetime(request.args.get('since'))
+    until = parse_datetime(request.args.get('until'))
+    if request.args.get('since') and not since:
+        return jsonify({'error': 'since must be an ISO 8601 datetime'}), 400
+    if request.args.get('until') and not until:
+        return jsonify({'error': 'until must be an ISO 8601 datetime'}), 400
+    if since:
+        query = query.filter(Notification.timestamp >= since)
+    if until:
+        query = query.filter(Notification.timestamp < until)
+    
+    if request.args.get('cursor'):
+        cursor = decode_cursor(request.args['cursor'])
+        if not cursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(
+            db.tuple_(Notification.timestamp, Notification.id) < cursor
+        )
+    
+    # Served by ix_notification_user_timestamp
+    rows = query.order_by(
+        Notification.timestamp.desc(),
+        Notification.id.desc()
+    ).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1][0].timestamp, rows[-1][0].id) if has_more else None
+    
+    return jsonify({
+        'notifications': [{
+            'id': str(n.id),
+            'personName': n.person_name,
+            'timestamp': n.timestamp.isoformat() if n.timestamp else None,
+            'status': n.status,
+            'imageUrl': n.image_path or 'https://placehold.co/400',
+            'confidence': n.confidence * 100 if n.confidence else None,
+            'count': n.event_count,
+            'device': device_name or 'Unknown Device'
+        } for n, device_name in rows],
+        'count': len(rows),
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }), 200
 
 # Add this route to your existing notification.py
 
@@ -357,8 +430,6 @@ def initiate_doorbell_call():
     
     # Initiate call using Africa's Talking
     try:
-        import requests
-        
         # Africa's Talking API credentials
         username = Config.AT_USERNAME
         api_key = Config.AT_API_KEY
@@ -378,8 +449,8 @@ def initiate_doorbell_call():
             'callBackUrl': f"{Config.BASE_URL}/api/notifications/at_voice_callback",
         }
         
-        response = requests.post("https://voice.africastalking.com/call", 
-                                headers=headers, data=payload, timeout=10)
+        response = get_http_session().post("https://voice.africastalking.com/call", 
+                                           headers=headers, data=payload, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
         call_data = response.json()
@@ -1,75 +1,97 @@
 import io
-import os
-import cv2
-import numpy as np
+import hmac
+import json
+import math
 import threading
 import time
-from datetime import datetime
+import uuid
+from datetime import datetime, timezone
+from functools import wraps
 from flask import Blueprint, jsonify, request, send_file, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import json
+from config import Config
+from models import Device
+from frame_delta import (
+    DEFAULT_TILE_SIZE,
+    decode_jpeg,
+    parse_tile_key,
+    rebuild_frame
+)
+from clip_store import (
+    record_frame,
+    has_active_clip,
+    start_event_clip,
+    list_clips,
+    get_clip_paths,
+    load_clip_index,
+    read_clip_frame
+)
+from frame_log import get_frame_log, log_frame
+from frame_store import get_frame_store
+from face_detection import detect_faces, run_blocking
 
 video_bp = Blueprint('video', __name__)
 
-# Store frames per device
-device_frames = {}
-device_frames_lock = threading.Lock()
-device_last_update = {}
-
-# Store face detection/recognition results
-device_detections = {}
-device_detections_lock = threading.Lock()
+# Latest frame, owner and detections per device (in-process or shared memory)
+frame_store = get_frame_store()
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Keyframes of devices using the tile delta transport. Entries are replaced
+# whole and keyframes are never written to, so readers need no lock.
+device_delta_state = {}
 
-# Move up one level to the project root (web_backend/) and into models/
-MODEL_DIR = os.path.join(BASE_DIR, "..", "models")
+# Registered device ids seen by device_auth_required, with when they were checked
+registered_devices = {}
+registered_devices_lock = threading.Lock()
+REGISTERED_DEVICE_TTL = 60.0
 
-PROTOTXT_PATH = os.path.join(MODEL_DIR, "deploy.prototxt")
-MODEL_PATH = os.path.join(MODEL_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+def is_registered_device(device_id) -> bool:
+    """Whether device_id is a Device row; positive answers are cached briefly since devices post often"""
+    now = time.time()
+    with registered_devices_lock:
+        checked_at = registered_devices.get(device_id)
+    if checked_at is not None and now - checked_at < REGISTERED_DEVICE_TTL:
+        return True
+    try:
+        device_uuid = uuid.UUID(str(device_id))
+    except ValueError:
+        return False
+    if Device.query.filter_by(id=device_uuid).first() is None:
+        return False
+    with registered_devices_lock:
+        registered_devices[device_id] = now
+    return True
 
-# Load face detection model
-face_net = cv2.dnn.readNetFromCaffe(PROTOTXT_PATH, MODEL_PATH)
+def device_auth_required(fn):
+    """
+    For routes devices post to: the device must be registered and, when
+    DEVICE_API_KEY is set, send it in the X-Device-Key header.
+    """
+    @wraps(fn)
+    def wrapper(device_id, *args, **kwargs):
+        if Config.DEVICE_API_KEY and not hmac.compare_digest(
+            request.headers.get('X-Device-Key', ''), Config.DEVICE_API_KEY
+        ):
+            return jsonify({'error': 'Invalid device key'}), 401
+        if not is_registered_device(device_id):
+            return jsonify({'error': 'Unknown device'}), 404
+        return fn(device_id, *args, **kwargs)
+    return wrapper
 
-def detect_faces(frame_bytes):
-    """Detect faces in frame using DNN"""
+def check_device_owner(device_id):
+    """
+    Error response unless the current user owns the device, else None.
+    Ownership comes from the database, so recorded clips and frames stay
+    reachable after the stream stops or the server restarts.
+    """
+    user_identity = json.loads(get_jwt_identity())
     try:
-        # Convert bytes to numpy array
-        nparr = np.frombuffer(frame_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if frame is None:
-            return []
-        
-        (h, w) = frame.shape[:2]
-        blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0,
-                                     (300, 300), (104.0, 177.0, 123.0))
-        
-        face_net.setInput(blob)
-        detections = face_net.forward()
-        
-        faces = []
-        for i in range(0, detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-            
-            if confidence > 0.5:  # Confidence threshold
-                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                (startX, startY, endX, endY) = box.astype("int")
-                
-                # Ensure bounding boxes fall within the dimensions of the frame
-                startX = max(0, startX)
-                startY = max(0, startY)
-                endX = min(w, endX)
-                endY = min(h, endY)
-                
-                faces.append({
-                    'box': [int(startX), int(startY), int(endX), int(endY)],
-                    'confidence': float(confidence)
-                })
-        
-        return faces
-    except Exception as e:
-        print(f"[ERROR] Face detection failed: {e}")
-        return []
+        device_uuid = uuid.UUID(str(device_id))
+    except ValueError:
+        return jsonify({'error': 'Invalid device ID format'}), 400
+    device = Device.query.filter_by(id=device_uuid, owner_id=uuid.UUID(user_identity['id'])).first()
+    if not device:
+        return jsonify({'error': 'Device not found or unauthorized'}), 404
+    return None
 
 @video_bp.route('/stream/start', methods=['POST'])
 @jwt_required()
@@ -82,13 +104,7 @@ def start_stream():
     if not device_id:
         return jsonify({'error': 'deviceId required'}), 400
     
-    with device_frames_lock:
-        device_frames[device_id] = {
-            'frame': None,
-            'timestamp': None,
-            'user_id': user_id
-        }
-        device_last_update[device_id] = datetime.utcnow()
+    frame_store.init_stream(device_id, user_id)
     
     return jsonify({
         'message': 'Stream initialized',
@@ -96,7 +112,28 @@ def start_stream():
         'stream_url': f'/api/video/stream/{device_id}'
     }), 200
 
+def store_device_frame(device_id, img_bytes, frame=None):
+    """Store the latest frame for a device and run face detection on it (on frame, if already decoded)"""
+    faces = detect_faces(img_bytes, frame)
+    
+    frame_store.put_frame(device_id, img_bytes)
+    frame_store.put_detections(device_id, {
+        'faces': faces,
+        'timestamp': datetime.utcnow().isoformat()
+    })
+    
+    record_frame(device_id, img_bytes)
+    log_frame(device_id, img_bytes)
+    if faces and not has_active_clip(device_id):
+        try:
+            start_event_clip(device_id, 'face_detected')
+        except OSError as e:
+            print(f"[ERROR] Failed to start event clip: {e}")
+    
+    return faces
+
 @video_bp.route('/stream/<device_id>/frame', methods=['POST'])
+@device_auth_required
 def post_device_frame(device_id):
     """Receive frame from Raspberry Pi device"""
     if 'frame' not in request.files:
@@ -105,30 +142,77 @@ def post_device_frame(device_id):
     file = request.files['frame']
     img_bytes = file.read()
     
-    # Detect faces
-    faces = detect_faces(img_bytes)
+    faces = store_device_frame(device_id, img_bytes)
+    
+    return jsonify({
+        'status': 'ok',
+        'deviceId': device_id,
+        'faces_detected': len(faces),
+        'timestamp': datetime.utcnow().isoformat()
+    }), 200
+
+@video_bp.route('/stream/<device_id>/delta', methods=['POST'])
+@device_auth_required
+def post_device_delta(device_id):
+    """
+    Receive a keyframe or a set of changed tiles from a device.
+    A keyframe is sent as 'frame' with form field keyframe_seq; deltas are
+    sent as tile_<row>_<col> JPEG files that reference the same keyframe_seq.
+    """
+    try:
+        keyframe_seq = int(request.form.get('keyframe_seq', ''))
+        tile_size = int(request.form.get('tile_size', DEFAULT_TILE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'keyframe_seq and tile_size must be integers'}), 400
+    
+    if tile_size <= 0:
+        return jsonify({'error': 'tile_size must be positive'}), 400
     
-    with device_frames_lock:
-        if device_id not in device_frames:
-            device_frames[device_id] = {
-                'frame': None,
-                'timestamp': None,
-                'user_id': None
-            }
+    if 'frame' in request.files:
+        img_bytes = request.files['frame'].read()
+        canvas = run_blocking(decode_jpeg, img_bytes)
+        if canvas is None:
+            return jsonify({'error': 'Invalid keyframe'}), 400
         
-        device_frames[device_id]['frame'] = img_bytes
-        device_frames[device_id]['timestamp'] = datetime.utcnow()
-        device_last_update[device_id] = datetime.utcnow()
-    
-    with device_detections_lock:
-        device_detections[device_id] = {
-            'faces': faces,
-            'timestamp': datetime.utcnow()
+        device_delta_state[device_id] = {
+            'keyframe': canvas,
+            'keyframe_seq': keyframe_seq,
+            'tile_size': tile_size
         }
+        
+        faces = store_device_frame(device_id, img_bytes, canvas)
+        return jsonify({
+            'status': 'ok',
+            'deviceId': device_id,
+            'keyframe_seq': keyframe_seq,
+            'tiles_applied': 0,
+            'faces_detected': len(faces),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+    
+    state = device_delta_state.get(device_id)
+    if not state or state['keyframe_seq'] != keyframe_seq or state['tile_size'] != tile_size:
+        # Device must resend a keyframe before deltas can be applied
+        return jsonify({'error': 'Keyframe required', 'keyframe_required': True}), 409
+    
+    tiles = []
+    for key, file in request.files.items():
+        position = parse_tile_key(key)
+        if position is not None:
+            tiles.append((position[0], position[1], file.read()))
+    
+    # Devices diff every frame against the keyframe, not the previous frame,
+    # so the current frame is the keyframe plus exactly these tiles. Decoding,
+    # pasting and re-encoding run off the event loop.
+    canvas, img_bytes, applied = run_blocking(rebuild_frame, state['keyframe'], tiles, tile_size)
+    
+    faces = store_device_frame(device_id, img_bytes, canvas)
     
     return jsonify({
         'status': 'ok',
         'deviceId': device_id,
+        'keyframe_seq': keyframe_seq,
+        'tiles_applied': applied,
         'faces_detected': len(faces),
         'timestamp': datetime.utcnow().isoformat()
     }), 200
@@ -139,20 +223,19 @@ def get_device_frame(device_id):
     """Get latest frame for a specific device"""
     user_id = get_jwt_identity()
     
-    with device_frames_lock:
-        if device_id not in device_frames:
-            return jsonify({'error': 'Device stream not found'}), 404
-        
-        # Check authorization
-        device_info = device_frames[device_id]
-        if device_info['user_id'] and device_info['user_id'] != user_id:
-            return jsonify({'error': 'Unauthorized to access this stream'}), 403
-        
-        frame_bytes = device_info['frame']
-        timestamp = device_info['timestamp']
-        
-        if not frame_bytes:
-            return jsonify({'available': False}), 404
+    device_info = frame_store.get_stream(device_id)
+    if device_info is None:
+        return jsonify({'error': 'Device stream not found'}), 404
+    
+    # Check authorization
+    if device_info['user_id'] and device_info['user_id'] != user_id:
+        return jsonify({'error': 'Unauthorized to access this stream'}), 403
+    
+    frame_bytes = device_info['frame']
+    timestamp = device_info['timestamp']
+    
+    if not frame_bytes:
+        return jsonify({'available': False}), 404
     
     # Return as JPEG
     buf = io.BytesIO(frame_bytes)
@@ -169,16 +252,14 @@ def get_device_detections(device_id):
     """Get face detection results for a device"""
     user_id = get_jwt_identity()
     
-    with device_frames_lock:
-        if device_id not in device_frames:
-            return jsonify({'error': 'Device stream not found'}), 404
-        
-        device_info = device_frames[device_id]
-        if device_info['user_id'] and device_info['user_id'] != user_id:
-            return jsonify({'error': 'Unauthorized'}), 403
+    device_info = frame_store.get_stream(device_id, include_frame=False)
+    if device_info is None:
+        return jsonify({'error': 'Device stream not found'}), 404
     
-    with device_detections_lock:
-        detections = device_detections.get(device_id, {'faces': [], 'timestamp': None})
+    if device_info['user_id'] and device_info['user_id'] != user_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    detections = frame_store.get_detections(device_id) or {'faces': [], 'timestamp': None}
     
     return jsonify(detections), 200
 
@@ -187,12 +268,12 @@ def stream_device_live(device_id):
     """Live video stream (MJPEG) for a specific device"""
     def generate():
         while True:
-            with device_frames_lock:
-                if device_id in device_frames and device_frames[device_id]['frame']:
-                    frame_bytes = device_frames[device_id]['frame']
-                else:
-                    time.sleep(0.1)
-                    continue
+            device_info = frame_store.get_stream(device_id)
+            if device_info and device_info['frame']:
+                frame_bytes = device_info['frame']
+            else:
+                time.sleep(0.1)
+                continue
             
             # Send MJPEG frame
             yield (b'--frame\r\n'
@@ -205,22 +286,22 @@ def stream_device_live(device_id):
 @jwt_required()
 def get_stream_info(device_id):
     """Get stream information and status"""
-    with device_frames_lock:
-        if device_id not in device_frames:
-            return jsonify({'error': 'Stream not found'}), 404
-        
-        last_update = device_last_update.get(device_id)
-        is_active = False
-        if last_update:
-            time_diff = (datetime.utcnow() - last_update).total_seconds()
-            is_active = time_diff < 5  # Consider active if updated in last 5 seconds
-        
-        return jsonify({
-            'deviceId': device_id,
-            'active': is_active,
-            'last_update': last_update.isoformat() if last_update else None,
-            'has_frame': device_frames[device_id]['frame'] is not None
-        }), 200
+    device_info = frame_store.get_stream(device_id, include_frame=False)
+    if device_info is None:
+        return jsonify({'error': 'Stream not found'}), 404
+    
+    last_update = device_info['last_update']
+    is_active = False
+    if last_update:
+        time_diff = (datetime.utcnow() - last_update).total_seconds()
+        is_active = time_diff < 5  # Consider active if updated in last 5 seconds
+    
+    return jsonify({
+        'deviceId': device_id,
+        'active': is_active,
+        'last_update': last_update.isoformat() if last_update else None,
+        'has_frame': device_info['has_frame']
+    }), 200
 
 @video_bp.route('/stream/<device_id>/stop', methods=['POST'])
 @jwt_required()
@@ -228,18 +309,137 @@ def stop_stream(device_id):
     """Stop streaming for a device"""
     user_id = get_jwt_identity()
     
-    with device_frames_lock:
-        if device_id in device_frames:
-            # Check authorization
-            if device_frames[device_id]['user_id'] and device_frames[device_id]['user_id'] != user_id:
-                return jsonify({'error': 'Unauthorized'}), 403
-            
-            del device_frames[device_id]
+    device_info = frame_store.get_stream(device_id, include_frame=False)
+    if device_info is not None:
+        # Check authorization
+        if device_info['user_id'] and device_info['user_id'] != user_id:
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        frame_store.remove(device_id)
+    
+    device_delta_state.pop(device_id, None)
+    
+    return jsonify({'message': 'Stream stopped', 'deviceId': device_id}), 200
+
+@video_bp.route('/stream/<device_id>/event', methods=['POST'])
+@device_auth_required
+def trigger_device_event(device_id):
+    """Capture an event clip (pre-roll + post-roll), e.g. when the doorbell is pressed"""
+    data = request.get_json(silent=True) or {}
+    reason = data.get('reason', 'doorbell')
+    
+    try:
+        pre_seconds = float(data['preSeconds']) if 'preSeconds' in data else None
+        post_seconds = float(data['postSeconds']) if 'postSeconds' in data else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'preSeconds and postSeconds must be numbers'}), 400
+    
+    # start_event_clip clamps both to PREROLL_SECONDS / POSTROLL_MAX_SECONDS and
+    # extends the device's running clip rather than opening a second one
+    try:
+        clip = start_event_clip(device_id, reason, pre_seconds, post_seconds)
+    except OSError as e:
+        print(f"[ERROR] Failed to start event clip: {e}")
+        return jsonify({'error': 'Failed to start clip'}), 500
+    
+    return jsonify({
+        'message': 'Clip extended' if clip['extended'] else 'Clip capture started',
+        'clip': clip,
+        'clip_url': f"/api/video/stream/{device_id}/clips/{clip['clip_id']}"
+    }), 201
+
+@video_bp.route('/stream/<device_id>/clips', methods=['GET'])
+@jwt_required()
+def get_device_clips(device_id):
+    """List event clips captured for a device"""
+    denied = check_device_owner(device_id)
+    if denied:
+        return denied
+    
+    clips = list_clips(device_id)
+    return jsonify({'deviceId': device_id, 'clips': clips, 'count': len(clips)}), 200
+
+@video_bp.route('/stream/<device_id>/clips/<clip_id>', methods=['GET'])
+@jwt_required()
+def get_device_clip(device_id, clip_id):
+    """Range-readable raw clip data (concatenated JPEG frames)"""
+    denied = check_device_owner(device_id)
+    if denied:
+        return denied
+    
+    paths = get_clip_paths(device_id, clip_id)
+    if not paths:
+        return jsonify({'error': 'Clip not found'}), 404
     
-    if device_id in device_last_update:
-        del device_last_update[device_id]
+    return send_file(
+        paths['data'],
+        mimetype='application/octet-stream',
+        conditional=True,
+        download_name=f'{clip_id}.mjpeg'
+    )
+
+@video_bp.route('/stream/<device_id>/clips/<clip_id>/index', methods=['GET'])
+@jwt_required()
+def get_device_clip_index(device_id, clip_id):
+    """Frame time index (timestamp, byte offset, length) for a clip"""
+    denied = check_device_owner(device_id)
+    if denied:
+        return denied
     
-    if device_id in device_detections:
-        del device_detections[device_id]
+    index = load_clip_index(device_id, clip_id)
+    if index is None:
+        return jsonify({'error': 'Clip not found'}), 404
     
-    return jsonify({'message': 'Stream stopped', 'deviceId': device_id}), 200
\ No newline at end of file
+    return jsonify({'clip_id': clip_id, 'frames': index, 'count': len(index)}), 200
+
+@video_bp.route('/stream/<device_id>/clips/<clip_id>/frames/<int:frame_no>', methods=['GET'])
+@jwt_required()
+def get_device_clip_frame(device_id, clip_id, frame_no):
+    """Single JPEG frame from a clip"""
+    denied = check_device_owner(device_id)
+    if denied:
+        return denied
+    
+    frame_bytes = read_clip_frame(device_id, clip_id, frame_no)
+    if frame_bytes is None:
+        return jsonify({'error': 'Frame not found'}), 404
+    
+    return Response(frame_bytes, mimetype='image/jpeg')
+
+@video_bp.route('/stream/<device_id>/at', methods=['GET'])
+@jwt_required()
+def get_device_frame_at(device_id):
+    """Frame recorded at or just before ?ts= (unix seconds or ISO 8601)"""
+    denied = check_device_owner(device_id)
+    if denied:
+        return denied
+    
+    ts_raw = request.args.get('ts')
+    if not ts_raw:
+        return jsonify({'error': 'ts required'}), 400
+    
+    try:
+        ts = float(ts_raw)
+    except ValueError:
+        try:
+            when = datetime.fromisoformat(ts_raw)
+        except ValueError:
+            return jsonify({'error': 'Invalid ts format'}), 400
+        # A timestamp without an offset is UTC, not the server's local time
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        ts = when.timestamp()
+    if not math.isfinite(ts):
+        return jsonify({'error': 'Invalid ts format'}), 400
+    
+    result = get_frame_log(device_id).frame_at(ts)
+    if result is None:
+        return jsonify({'error': 'No frame recorded at that time'}), 404
+    
+    frame_ts, frame_view = result
+    # WSGI servers only accept bytes body items, so the view is copied once here
+    return Response(
+        bytes(frame_view),
+        mimetype='image/jpeg',
+        headers={'X-Frame-Timestamp': str(frame_ts)}
+    )
@@ -2,15 +2,26 @@ from flask import Blueprint, json, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, User, WatchlistMember, FaceImage, Device
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 import os
 from werkzeug.utils import secure_filename
 import uuid
+import tempfile
 from supabase_client import (
-    upload_watchlist_image, 
-    get_watchlist_images_for_device,
-    delete_watchlist_image,
+    upload_watchlist_images,
+    compute_content_hash,
+    FACE_CROP_SUFFIX,
+    iter_watchlist_images_for_device,
+    delete_files,
+    download_file,
     get_public_url
 )
+from storage_cleanup import enqueue_watchlist_deletion
+from thumbnails import invalidate_thumbnails
+from watchlist_import import start_import, get_import_job
+from watchlist_manifest import record_image_changes, insert_face_images, current_version, build_manifest
+from face_detection import normalize_face
+from config import Config
 
 watchlist_bp = Blueprint('watchlist', __name__)
 
@@ -35,7 +46,9 @@ def get_watchlist():
     
     device_id = str(device.id)
     
-    members = WatchlistMember.query.filter_by(user_id=user_id).all()
+    members = WatchlistMember.query.options(
+        db.selectinload(WatchlistMember.images)
+    ).filter_by(user_id=user_id).all()
     
     return jsonify([{
         "id": str(m.id),
@@ -46,6 +59,8 @@ def get_watchlist():
         "images": [{
             "id": str(img.id),
             "url": get_face_image_url(img, device_id),
+            "faceUrl": get_public_url('images', img.face_path) if img.face_path else None,
+            "faceBox": img.face_box,
             "filename": img.filename,
             "uploadDate": img.uploaded_at.isoformat() if img.uploaded_at else None
         } for img in m.images]
@@ -93,6 +108,8 @@ def get_single_watchlist_member(member_id):
         "images": [{
             "id": str(img.id),
             "url": get_face_image_url(img, device_id),
+            "faceUrl": get_public_url('images', img.face_path) if img.face_path else None,
+            "faceBox": img.face_box,
             "filename": img.filename,
             "uploadDate": img.uploaded_at.isoformat() if img.uploaded_at else None
         } for img in member.images]
@@ -194,17 +211,19 @@ def delete_watchlist_member(member_id):
     
     # Get user's device
     device = Device.query.filter_by(owner_id=user_id).first()
-    if device:
-        device_id = str(device.id)
-        
-        # Delete images from Supabase
-        for image in member.images:
-            if image.supabase_path:
-                delete_watchlist_image(device_id, image.supabase_path)
+    image_paths = [
+        path for image in member.images
+        for path in (image.supabase_path, image.face_path) if path
+    ]
     
     # Delete from database
+    record_image_changes(member.images, 'delete')
     db.session.delete(member)
     db.session.commit()
+    
+    # Storage objects are removed in the background once the rows are gone
+    if device:
+        enqueue_watchlist_deletion(str(device.id), image_paths)
 
     return jsonify({"message": "Member removed from watchlist"}), 200
 
@@ -227,7 +246,6 @@ def upload_images_to_member(member_id):
         return jsonify({"error": "No images provided"}), 400
 
     files = request.files.getlist('images')
-    uploaded = []
     
     # Get user's device
     device = Device.query.filter_by(owner_id=user_id).first()
@@ -236,54 +254,170 @@ def upload_images_to_member(member_id):
     
     device_id = str(device.id)
     
+    # Hash the spooled uploads in chunks; workers stream them to storage
+    pending = []
+    failed = []
     for file in files:
         if file and file.filename and allowed_file(file.filename):
-            try:
-                # Read file bytes
-                file_bytes = file.read()
-                
-                # Upload to Supabase
-                upload_result = upload_watchlist_image(
-                    user_id=user_id,
-                    device_id=device_id,
-                    watchlist_id=str(member.id),
-                    watchlist_name=member.name,
-                    file_bytes=file_bytes,
-                    filename=secure_filename(file.filename),
-                    content_type=file.mimetype
-                )
-                
-                if upload_result.get('success'):
-                    # Create FaceImage record
-                    img = FaceImage(
-                        id=uuid.uuid4(),
-                        member_id=member.id,
-                        filename=secure_filename(file.filename),
-                        supabase_path=upload_result.get('path'),
-                        path=upload_result.get('public_url') or upload_result.get('signed_url', '')
-                    )
-                    db.session.add(img)
-                    
-                    uploaded.append({
-                        "id": str(img.id),
-                        "url": upload_result.get('public_url') or upload_result.get('signed_url', ''),
-                        "filename": img.filename,
-                        "uploadDate": img.uploaded_at.isoformat() if img.uploaded_at else None
-                    })
-                else:
-                    print(f"[ERROR] Failed to upload image: {upload_result.get('error')}")
-                    
-            except Exception as e:
-                print(f"[ERROR] Error uploading image: {e}")
-                continue
-
+            pending.append({
+                'filename': secure_filename(file.filename),
+                'stream': file.stream,
+                'content_type': file.mimetype,
+                'content_hash': compute_content_hash(file.stream)
+            })
+        elif file and file.filename:
+            failed.append({"filename": file.filename, "error": "File type not allowed"})
+    
+    # Skip files whose bytes this member already has, or that repeat within the batch
+    existing_by_hash = {
+        img.content_hash: img
+        for img in FaceImage.query.filter(
+            FaceImage.member_id == member.id,
+            FaceImage.content_hash.in_([item['content_hash'] for item in pending])
+        )
+    } if pending else {}
+    duplicates = []
+    unique = []
+    seen_hashes = set()
+    for item in pending:
+        existing = existing_by_hash.get(item['content_hash'])
+        if existing or item['content_hash'] in seen_hashes:
+            duplicates.append({
+                "filename": item['filename'],
+                "id": str(existing.id) if existing else None
+            })
+            continue
+        seen_hashes.add(item['content_hash'])
+        unique.append(item)
+    pending = unique
+    
+    results = upload_watchlist_images(
+        user_id=user_id,
+        device_id=device_id,
+        watchlist_id=str(member.id),
+        watchlist_name=member.name,
+        files=pending,
+        derive_face=normalize_face if Config.FACE_CROP_ENABLED else None
+    )
+    
+    images = []
+    face_urls = {}
+    storage_failures = 0
+    for item in results:
+        upload_result = item.get('result') or {}
+        if not upload_result.get('success'):
+            failed.append({"filename": item['filename'], "error": item.get('error', 'Upload failed')})
+            # Storage rejecting the file itself (bad request, too large, bad type) is the client's fault
+            if item.get('status') not in (400, 413, 415):
+                storage_failures += 1
+            continue
+        
+        url = upload_result.get('public_url') or upload_result.get('signed_url', '')
+        img = FaceImage(
+            id=uuid.uuid4(),
+            member_id=member.id,
+            filename=item['filename'],
+            supabase_path=upload_result.get('path'),
+            path=url,
+            content_hash=upload_result.get('content_hash'),
+            face_path=(upload_result.get('face') or {}).get('path'),
+            face_box=(upload_result.get('face') or {}).get('box'),
+            size=upload_result.get('size'),
+            uploaded_at=datetime.utcnow()
+        )
+        images.append(img)
+        face_urls[img.id] = (upload_result.get('face') or {}).get('public_url')
+    
+    # Insert all FaceImage rows in one step; bytes a concurrent upload
+    # already added for this member reuse that row
+    existing_ids = insert_face_images(images)
     db.session.commit()
+    
+    uploaded = []
+    for img in images:
+        if img.id in existing_ids:
+            duplicates.append({"filename": img.filename, "id": str(existing_ids[img.id])})
+            continue
+        uploaded.append({
+            "id": str(img.id),
+            "url": img.path,
+            "faceUrl": face_urls[img.id],
+            "faceBox": img.face_box,
+            "filename": img.filename,
+            "uploadDate": img.uploaded_at.isoformat()
+        })
+    
+    if failed and not uploaded and not duplicates:
+        return jsonify({
+            "error": "No images were uploaded",
+            "failed": failed
+        }), 502 if storage_failures else 400
 
     return jsonify({
         "message": f"{len(uploaded)} image(s) uploaded",
-        "images": uploaded
+        "images": uploaded,
+        "duplicates": duplicates,
+        "failed": failed
     }), 201
 
+@watchlist_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_watchlist_archive():
+    """
+    Import a zip or tar archive laid out as member_name/<image>. Missing
+    members are created and images uploaded in the background; poll the
+    returned statusUrl for progress.
+    """
+    user_identity_raw = get_jwt_identity()
+    user_identity = json.loads(user_identity_raw)
+    user_id = user_identity['id']
+    
+    archive = request.files.get('archive')
+    if not archive or not archive.filename:
+        return jsonify({"error": "No archive provided"}), 400
+    
+    device = Device.query.filter_by(owner_id=user_id).first()
+    if not device:
+        return jsonify({"error": "No device found for user"}), 404
+    
+    # The job outlives the request, so the spooled upload is copied to disk
+    fd, archive_path = tempfile.mkstemp(prefix='watchlist_import_')
+    with os.fdopen(fd, 'wb') as out:
+        archive.save(out)
+    
+    try:
+        job = start_import(
+            current_app._get_current_object(),
+            archive_path,
+            secure_filename(archive.filename),
+            user_id,
+            str(device.id),
+            allowed_file
+        )
+    except ValueError as e:
+        os.remove(archive_path)
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        "message": "Import started",
+        "job": job,
+        "statusUrl": f"/api/watchlist/import/{job['id']}"
+    }), 202
+
+@watchlist_bp.route('/import/<job_id>', methods=['GET'])
+@jwt_required()
+def get_watchlist_import(job_id):
+    """Progress of a watchlist archive import"""
+    user_identity_raw = get_jwt_identity()
+    user_identity = json.loads(user_identity_raw)
+    user_id = user_identity['id']
+    
+    job = get_import_job(job_id, user_id)
+    if job is None:
+        return jsonify({"error": "Import job not found"}), 404
+    
+    return jsonify(job), 200
+
 @watchlist_bp.route('/images/<image_id>', methods=['DELETE'])
 @jwt_required()
 def delete_image(image_id):
@@ -305,22 +439,71 @@ def delete_image(image_id):
     
     # Get user's device
     device = Device.query.filter_by(owner_id=user_id).first()
-    if device and image.supabase_path:
-        device_id = str(device.id)
-        delete_watchlist_image(device_id, image.supabase_path)
+    image_paths = [path for path in (image.supabase_path, image.face_path) if path]
     
+    record_image_changes([image], 'delete')
     db.session.delete(image)
     db.session.commit()
+    
+    if device and image_paths:
+        enqueue_watchlist_deletion(str(device.id), image_paths)
 
     return jsonify({"message": "Image deleted"}), 200
 
+@watchlist_bp.route('/devices/<device_id>/manifest', methods=['GET'])
+@jwt_required()
+def get_device_manifest(device_id):
+    """
+    Watchlist images a device should cache, with a monotonically increasing
+    version. With ?since=<version> only images changed or deleted after that
+    version are returned. The ETag is derived from the version, so a device
+    polling with If-None-Match gets 304 until something changes.
+    """
+    user_identity_raw = get_jwt_identity()
+    user_identity = json.loads(user_identity_raw)
+    user_id = user_identity['id']
+    
+    try:
+        device_uuid = uuid.UUID(device_id)
+    except ValueError:
+        return jsonify({"error": "Invalid device ID format"}), 400
+    
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({"error": "since must be an integer version"}), 400
+        if since < 0:
+            return jsonify({"error": "since must be an integer version"}), 400
+    
+    device = Device.query.filter_by(id=device_uuid, owner_id=user_id).first_or_404()
+    
+    etag = f"{device.id}-{current_version(device.id)}-{'full' if since is None else since}"
+    if request.if_none_match.contains(etag):
+        return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    
+    response = jsonify(build_manifest(device.id, user_id, since))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response, 200
+
 @watchlist_bp.route('/sync-images', methods=['POST'])
 @jwt_required()
 def sync_watchlist_images():
-    """Sync watchlist images from Supabase to local database"""
+    """
+    Reconcile watchlist images in Supabase storage with FaceImage rows.
+    Missing rows are bulk-inserted; with removeOrphanRows / removeOrphanObjects
+    set in the body, rows without an object and objects without a member are
+    removed. dryRun reports the diff without changing anything.
+    """
     user_identity_raw = get_jwt_identity()
     user_identity = json.loads(user_identity_raw)
     user_id = user_identity['id']
+    data = request.get_json(silent=True) or {}
+    remove_orphan_rows = bool(data.get('removeOrphanRows', False))
+    remove_orphan_objects = bool(data.get('removeOrphanObjects', False))
+    dry_run = bool(data.get('dryRun', False))
     
     # Get user's device
     device = Device.query.filter_by(owner_id=user_id).first()
@@ -329,46 +512,125 @@ def sync_watchlist_images():
     
     device_id = str(device.id)
     
-    # Get all images from Supabase for this device
-    supabase_images = get_watchlist_images_for_device(device_id)
-    
-    # Get all watchlist members for user
-    members = WatchlistMember.query.filter_by(user_id=user_id).all()
-    
-    synced_count = 0
-    for supabase_image in supabase_images:
-        # Extract watchlist ID from filename
-        # Format: deviceID/watchlistId_watchlistName.ext
-        filename = supabase_image['filename']
+    # Stream all images from Supabase for this device; a partial listing
+    # must not be reconciled or live rows would be treated as orphans
+    try:
+        storage_by_path = {img['path']: img for img in iter_watchlist_images_for_device(device_id)}
+    except Exception as e:
+        print(f"[ERROR] Failed to list watchlist images: {e}")
+        return jsonify({"error": "Failed to list images from storage"}), 502
+    
+    # Member IDs and existing image paths, one query each
+    member_ids = {
+        str(member_id): member_id
+        for (member_id,) in db.session.query(WatchlistMember.id).filter_by(user_id=user_id)
+    }
+    existing_rows = {}
+    face_paths = set()
+    for image_id, path, face_path in db.session.query(
+        FaceImage.id, FaceImage.supabase_path, FaceImage.face_path
+    ).join(WatchlistMember).filter(
+        WatchlistMember.user_id == user_id, FaceImage.supabase_path.isnot(None)
+    ):
+        existing_rows[path] = image_id
+        if face_path:
+            face_paths.add(face_path)
+    
+    # Format: deviceID/watchlistId_watchlistName_suffix.ext
+    new_rows = []
+    orphan_objects = []
+    for path, supabase_image in storage_by_path.items():
+        if path.endswith(FACE_CROP_SUFFIX):
+            # Face crops belong to an original's row and never get rows of their own
+            if path not in face_paths:
+                orphan_objects.append(path)
+            continue
+        member_id = member_ids.get(supabase_image['filename'].split('_')[0])
+        if member_id is None:
+            orphan_objects.append(path)
+        elif path not in existing_rows:
+            new_rows.append({
+                'id': uuid.uuid4(),
+                'member_id': member_id,
+                'filename': supabase_image['filename'][:100],
+                'supabase_path': path,
+                'path': supabase_image['url'],
+                'size': supabase_image['size']
+            })
+    
+    orphan_rows = [
+        {'id': image_id, 'supabase_path': path} for path, image_id in existing_rows.items()
+        if path.startswith(f"{device_id}/") and path not in storage_by_path
+    ]
+    
+    removed_rows = 0
+    removed_objects = 0
+    duplicate_objects = 0
+    if not dry_run:
+        if new_rows:
+            # Hash the objects so later uploads of the same bytes are caught as duplicates
+            for row in new_rows:
+                data = download_file('images', row['supabase_path'])
+                row['content_hash'] = compute_content_hash(data) if data is not None else None
+            duplicate_objects = len(insert_face_images(new_rows))
         
-        # Try to extract watchlist ID (first part before underscore)
-        if '_' in filename:
-            watchlist_part = filename.split('_')[0]
-            
-            # Find matching watchlist member
-            for member in members:
-                if str(member.id) == watchlist_part:
-                    # Check if image already exists
-                    existing_image = FaceImage.query.filter_by(
-                        supabase_path=supabase_image['path']
-                    ).first()
-                    
-                    if not existing_image:
-                        # Create new FaceImage record
-                        img = FaceImage(
-                            id=uuid.uuid4(),
-                            member_id=member.id,
-                            filename=filename,
-                            supabase_path=supabase_image['path'],
-                            path=supabase_image['url']
-                        )
-                        db.session.add(img)
-                        synced_count += 1
-                    break
-    
-    db.session.commit()
+        if remove_orphan_rows:
+            for i in range(0, len(orphan_rows), 1000):
+                removed_rows += FaceImage.query.filter(
+                    FaceImage.id.in_([row['id'] for row in orphan_rows[i:i + 1000]])
+                ).delete(synchronize_session=False)
+            record_image_changes(orphan_rows, 'delete')
+        
+        db.session.commit()
+        
+        if remove_orphan_objects and orphan_objects:
+            failed = delete_files('images', orphan_objects)
+            invalidate_thumbnails('images', [path for path in orphan_objects if path not in failed])
+            removed_objects = len(orphan_objects) - len(failed)
     
     return jsonify({
-        "message": f"Synced {synced_count} images from Supabase",
-        "synced_count": synced_count
-    }), 200
\ No newline at end of file
+        "message": f"Synced {0 if dry_run else len(new_rows) - duplicate_objects} images from Supabase",
+        "synced_count": 0 if dry_run else len(new_rows) - duplicate_objects,
+        "dry_run": dry_run,
+        "storage_count": len(storage_by_path),
+        "database_count": len(existing_rows),
+        "missing_rows": len(new_rows),
+        "duplicate_objects": duplicate_objects,
+        "orphan_rows": len(orphan_rows),
+        "orphan_objects": len(orphan_objects),
+        "removed_rows": removed_rows,
+        "removed_objects": removed_objects
+    }), 200
+
+def backfill_content_hashes() -> int:
+    """
+    Fill in content_hash for rows stored without one (sync-created or older
+    rows) so re-uploads of their bytes are caught as duplicates. A row whose
+    bytes its member already has under another row is left without a hash.
+    """
+    filled = 0
+    for image in FaceImage.query.filter(
+        FaceImage.content_hash.is_(None), FaceImage.supabase_path.isnot(None)
+    ).all():
+        data = download_file('images', image.supabase_path)
+        if data is None:
+            continue
+        content_hash = compute_content_hash(data)
+        if FaceImage.query.filter_by(member_id=image.member_id, content_hash=content_hash).first():
+            print(f"[WARN] Image {image.id} duplicates another image of member {image.member_id}")
+            continue
+        image.content_hash = content_hash
+        image.size = image.size or len(data)
+        record_image_changes([image])
+        try:
+            db.session.commit()
+            filled += 1
+        except IntegrityError:
+            # A concurrent upload added the same bytes first
+            db.session.rollback()
+    return filled
+
+@watchlist_bp.cli.command('backfill-hashes')
+def backfill_hashes_command():
+    """Hash watchlist images stored without a content hash: flask watchlist backfill-hashes"""
+    print(f"[INFO] Backfilled content hashes for {backfill_content_hashes()} image(s)")
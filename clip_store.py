@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+from config import Config
+
+
+class FrameRingBuffer:
+    """Memory-bounded buffer of the most recent frames for one device"""
+
+    def __init__(self, max_seconds: float, max_bytes: int):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def append(self, ts: float, frame_bytes: bytes):
+        with self.lock:
+            self.frames.append((ts, frame_bytes))
+            self.total_bytes += len(frame_bytes)
+            # Drop by age first, then by size
+            while self.frames and (
+                ts - self.frames[0][0] > self.max_seconds or
+                self.total_bytes > self.max_bytes
+            ):
+                _, old = self.frames.popleft()
+                self.total_bytes -= len(old)
+
+    def since(self, start_ts: float) -> List:
+        with self.lock:
+            return [(ts, frame) for ts, frame in self.frames if ts >= start_ts]
+
+
+class ClipWriter:
+    """Append-only clip file of concatenated JPEG frames with a JSONL time index"""
+
+    def __init__(self, device_dir: str, meta: Dict):
+        self.clip_id = meta['clip_id']
+        self.meta = meta
+        self.end_ts = meta['ends_at']
+        self.meta_path = os.path.join(device_dir, f"{self.clip_id}.json")
+        self.data_path = os.path.join(device_dir, f"{self.clip_id}.mjpeg")
+        self.index_path = os.path.join(device_dir, f"{self.clip_id}.idx")
+        self.data_file = open(self.data_path, 'ab')
+        self.index_file = open(self.index_path, 'a')
+        self.offset = self.data_file.tell()
+        self.frame_count = 0
+        self.last_ts = None
+        self.closed = False
+        self.timer = None
+        self.lock = threading.RLock()
+        self.write_meta()
+
+    def write_meta(self):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def write(self, ts: float, frame_bytes: bytes):
+        with self.lock:
+            # Frames already written (e.g. as pre-roll) or past the post-roll are skipped
+            if self.closed or ts > self.end_ts or (self.last_ts is not None and ts <= self.last_ts):
+                return
+            self.data_file.write(frame_bytes)
+            self.data_file.flush()
+            self.index_file.write(json.dumps({
+                'ts': ts,
+                'offset': self.offset,
+                'length': len(frame_bytes)
+            }) + '\n')
+            self.index_file.flush()
+            self.offset += len(frame_bytes)
+            self.frame_count += 1
+            self.last_ts = ts
+
+    def extend(self, end_ts: float) -> bool:
+        """Push the end of the post-roll out; False once the clip has closed"""
+        with self.lock:
+            if self.closed:
+                return False
+            if end_ts > self.end_ts:
+                self.end_ts = end_ts
+                self.meta['ends_at'] = end_ts
+                self.write_meta()
+            return True
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.data_file.close()
+            self.index_file.close()
+
+
+# Per-device pre-roll buffers and the clip (at most one per device) still receiving post-roll
+device_buffers = {}
+device_active_clips = {}
+clip_store_lock = threading.Lock()
+
+
+def safe_device_dir(device_id: str) -> str:
+    """Directory holding clips for a device"""
+    safe_id = "".join(c for c in str(device_id) if c.isalnum() or c in ('-', '_'))
+    return os.path.join(Config.CLIPS_DIR, safe_id or 'unknown')
+
+
+def is_valid_clip_id(clip_id: str) -> bool:
+    return len(clip_id) == 32 and all(c in '0123456789abcdef' for c in clip_id)
+
+
+def get_buffer(device_id: str) -> FrameRingBuffer:
+    with clip_store_lock:
+        buf = device_buffers.get(device_id)
+        if buf is None:
+            buf = FrameRingBuffer(Config.PREROLL_SECONDS, Config.PREROLL_MAX_BYTES)
+            device_buffers[device_id] = buf
+        return buf
+
+
+def record_frame(device_id: str, frame_bytes: bytes, ts: Optional[float] = None):
+    """Add a frame to the device pre-roll buffer and to its clip if one is in post-roll"""
+    ts = ts if ts is not None else time.time()
+    get_buffer(device_id).append(ts, frame_bytes)
+
+    with clip_store_lock:
+        writer = device_active_clips.get(device_id)
+    # The file write happens outside the global lock; the writer has its own
+    if writer is not None:
+        writer.write(ts, frame_bytes)
+
+
+def schedule_finish(device_id: str, writer: ClipWriter):
+    if writer.timer is not None:
+        writer.timer.cancel()
+    writer.timer = threading.Timer(max(0.0, writer.end_ts - time.time()), finish_clip, args=(device_id, writer))
+    writer.timer.daemon = True
+    writer.timer.start()
+
+
+def finish_clip(device_id: str, writer: ClipWriter):
+    """Stop a clip once its post-roll has elapsed, whether or not frames still arrive"""
+    with clip_store_lock:
+        with writer.lock:
+            if writer.end_ts > time.time():
+                # Extended after this timer was set; the new timer finishes it
+                return
+            if device_active_clips.get(device_id) is writer:
+                del device_active_clips[device_id]
+            writer.close()
+
+
+def has_active_clip(device_id: str) -> bool:
+    with clip_store_lock:
+        return device_id in device_active_clips
+
+
+def clip_files(device_dir: str, clip_id: str) -> List[str]:
+    return [os.path.join(device_dir, f"{clip_id}{ext}") for ext in ('.json', '.mjpeg', '.idx')]
+
+
+def prune_clips(device_id: str, now: float = None):
+    """
+    Delete a device's finished clips, oldest first, that are older than
+    CLIP_RETENTION_SECONDS or push the device over CLIP_MAX_BYTES.
+    """
+    now = now if now is not None else time.time()
+    device_dir = safe_device_dir(device_id)
+    with clip_store_lock:
+        active = device_active_clips.get(device_id)
+    active_id = active.clip_id if active is not None else None
+
+    clips = []
+    total = 0
+    for meta in list_clips(device_id):
+        clip_id = meta.get('clip_id', '')
+        if not is_valid_clip_id(clip_id):
+            continue
+        size = 0
+        for path in clip_files(device_dir, clip_id):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        total += size
+        if clip_id != active_id:
+            clips.append((meta.get('event_at', 0), clip_id, size))
+
+    removed = 0
+    for event_at, clip_id, size in sorted(clips):
+        if now - event_at <= Config.CLIP_RETENTION_SECONDS and total <= Config.CLIP_MAX_BYTES:
+            break
+        for path in clip_files(device_dir, clip_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        removed += 1
+    if removed:
+        print(f"[INFO] Clip retention removed {removed} clip(s) of device {device_id}")
+
+
+def start_event_clip(device_id: str, reason: str,
+                     pre_seconds: float = None, post_seconds: float = None) -> Dict:
+    """
+    Write the pre-roll to a new clip and keep appending frames until the
+    post-roll ends. Both durations are clamped to the configured maximums.
+    A device has at most one clip in post-roll: an event during one extends
+    it instead, up to CLIP_MAX_SECONDS after the event that started it.
+    """
+    pre_seconds = Config.PREROLL_SECONDS if pre_seconds is None else pre_seconds
+    post_seconds = Config.POSTROLL_SECONDS if post_seconds is None else post_seconds
+    # The pre-roll buffer holds no more than PREROLL_SECONDS anyway
+    pre_seconds = min(max(pre_seconds, 0.0), Config.PREROLL_SECONDS)
+    post_seconds = min(max(post_seconds, 0.0), Config.POSTROLL_MAX_SECONDS)
+
+    now = time.time()
+    with clip_store_lock:
+        writer = device_active_clips.get(device_id)
+    if writer is not None:
+        end_ts = min(now + post_seconds, writer.meta['event_at'] + Config.CLIP_MAX_SECONDS)
+        if writer.extend(end_ts):
+            schedule_finish(device_id, writer)
+            return dict(writer.meta, extended=True)
+
+    prune_clips(device_id, now)
+    device_dir = safe_device_dir(device_id)
+    os.makedirs(device_dir, exist_ok=True)
+
+    clip_id = uuid.uuid4().hex
+    meta = {
+        'clip_id': clip_id,
+        'device_id': str(device_id),
+        'reason': reason,
+        'started_at': now - pre_seconds,
+        'event_at': now,
+        'ends_at': now + post_seconds
+    }
+    writer = ClipWriter(device_dir, meta)
+    buf = get_buffer(device_id)
+
+    # Live frames wait on the writer lock until the pre-roll is on disk, and
+    # any frame that is in both the pre-roll and the live path is skipped by
+    # timestamp, so the clip has no gap and no duplicates.
+    with writer.lock:
+        with clip_store_lock:
+            current = device_active_clips.get(device_id)
+            if current is not None:
+                # A concurrent event registered a clip first; extend that one instead
+                writer.close()
+                for path in clip_files(device_dir, clip_id):
+                    os.remove(path)
+                current.extend(min(now + post_seconds, current.meta['event_at'] + Config.CLIP_MAX_SECONDS))
+                schedule_finish(device_id, current)
+                return dict(current.meta, extended=True)
+            device_active_clips[device_id] = writer
+            preroll = buf.since(now - pre_seconds)
+        for ts, frame_bytes in preroll:
+            writer.write(ts, frame_bytes)
+
+    schedule_finish(device_id, writer)
+    return dict(meta, preroll_frames=len(preroll), extended=False)
+
+
+def list_clips(device_id: str) -> List[Dict]:
+    device_dir = safe_device_dir(device_id)
+    if not os.path.isdir(device_dir):
+        return []
+
+    clips = []
+    for name in os.listdir(device_dir):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(device_dir, name)) as f:
+                clips.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Failed to read clip metadata {name}: {e}")
+    clips.sort(key=lambda c: c.get('event_at', 0), reverse=True)
+    return clips
+
+
+def get_clip_paths(device_id: str, clip_id: str) -> Optional[Dict]:
+    if not is_valid_clip_id(clip_id):
+        return None
+    device_dir = safe_device_dir(device_id)
+    data_path = os.path.join(device_dir, f"{clip_id}.mjpeg")
+    if not os.path.exists(data_path):
+        return None
+    return {
+        'data': data_path,
+        'index': os.path.join(device_dir, f"{clip_id}.idx"),
+        'meta': os.path.join(device_dir, f"{clip_id}.json")
+    }
+
+
+def load_clip_index(device_id: str, clip_id: str) -> Optional[List[Dict]]:
+    paths = get_clip_paths(device_id, clip_id)
+    if not paths:
+        return None
+    index = []
+    with open(paths['index']) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                index.append(json.loads(line))
+    return index
+
+
+def read_clip_frame(device_id: str, clip_id: str, frame_no: int) -> Optional[bytes]:
+    index = load_clip_index(device_id, clip_id)
+    if index is None or frame_no < 0 or frame_no >= len(index):
+        return None
+    entry = index[frame_no]
+    with open(get_clip_paths(device_id, clip_id)['data'], 'rb') as f:
+        f.seek(entry['offset'])
+        return f.read(entry['length'])
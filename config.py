@@ -22,6 +22,40 @@ class Config:
     SUPABASE_URL = config('SUPABASE_URL')
     SUPABASE_KEY = config('SUPABASE_KEY')
     SUPABASE_BUCKET = config('SUPABASE_BUCKET', default='captured-faces')
+    SUPABASE_POOL_SIZE = config('SUPABASE_POOL_SIZE', default=20, cast=int)
+    SUPABASE_TIMEOUT = config('SUPABASE_TIMEOUT', default=30.0, cast=float)
+    SUPABASE_CONNECT_TIMEOUT = config('SUPABASE_CONNECT_TIMEOUT', default=5.0, cast=float)
+    STORAGE_LIST_PAGE_SIZE = config('STORAGE_LIST_PAGE_SIZE', default=1000, cast=int)
+    STORAGE_DELETE_BATCH_SIZE = config('STORAGE_DELETE_BATCH_SIZE', default=100, cast=int)
+    STORAGE_DELETE_RETRIES = config('STORAGE_DELETE_RETRIES', default=5, cast=int)
+    UPLOAD_CONCURRENCY = config('UPLOAD_CONCURRENCY', default=4, cast=int)
+    UPLOAD_RETRIES = config('UPLOAD_RETRIES', default=2, cast=int)
+    # Uploads larger than this spill from memory to a temp file
+    UPLOAD_SPOOL_THRESHOLD = config('UPLOAD_SPOOL_THRESHOLD', default=1024 * 1024, cast=int)
+
+    # Bulk watchlist import from zip/tar archives
+    IMPORT_WORKERS = config('IMPORT_WORKERS', default=2, cast=int)
+    IMPORT_BATCH_SIZE = config('IMPORT_BATCH_SIZE', default=32, cast=int)
+    IMPORT_MAX_IMAGE_BYTES = config('IMPORT_MAX_IMAGE_BYTES', default=10 * 1024 * 1024, cast=int)
+    IMPORT_JOB_TTL = config('IMPORT_JOB_TTL', default=3600, cast=int)
+
+    # Upload-time face normalization of enrollment photos
+    FACE_CROP_ENABLED = config('FACE_CROP_ENABLED', default=True, cast=bool)
+    FACE_CROP_SIZE = config('FACE_CROP_SIZE', default=160, cast=int)
+    FACE_CROP_MARGIN = config('FACE_CROP_MARGIN', default=0.2, cast=float)
+
+    # On-the-fly thumbnails
+    THUMB_CACHE_DIR = config('THUMB_CACHE_DIR', default='thumb_cache')
+    THUMB_MEMORY_CACHE_BYTES = config('THUMB_MEMORY_CACHE_BYTES', default=64 * 1024 * 1024, cast=int)
+    THUMB_DISK_CACHE_BYTES = config('THUMB_DISK_CACHE_BYTES', default=1024 * 1024 * 1024, cast=int)
+    THUMB_QUALITY = config('THUMB_QUALITY', default=80, cast=int)
+    THUMB_MAX_AGE = config('THUMB_MAX_AGE', default=3600, cast=int)
+
+    # Perceptual-hash suppression of near-identical captured faces
+    PHASH_ENABLED = config('PHASH_ENABLED', default=True, cast=bool)
+    PHASH_WINDOW_SECONDS = config('PHASH_WINDOW_SECONDS', default=30.0, cast=float)
+    PHASH_WINDOW_SIZE = config('PHASH_WINDOW_SIZE', default=50, cast=int)
+    PHASH_MAX_DISTANCE = config('PHASH_MAX_DISTANCE', default=6, cast=int)
     
     # Maileroo SMTP settings
     MAILERO_API_KEY = config('MAILERO_API_KEY', default='your-mailero-api-key')
@@ -41,9 +75,52 @@ class Config:
     EMAIL_ENABLED = config('EMAIL_ENABLED', default=True, cast=bool)
     PUSH_ENABLED = config('PUSH_ENABLED', default=True, cast=bool)
     CALL_ENABLED = config('CALL_ENABLED', default=False, cast=bool)
+    WHATSAPP_ENABLED = config('WHATSAPP_ENABLED', default=True, cast=bool)
+
+    # Background notification delivery
+    NOTIFY_EMAIL_CONCURRENCY = config('NOTIFY_EMAIL_CONCURRENCY', default=4, cast=int)
+    NOTIFY_WHATSAPP_CONCURRENCY = config('NOTIFY_WHATSAPP_CONCURRENCY', default=2, cast=int)
+    NOTIFY_MAX_RETRIES = config('NOTIFY_MAX_RETRIES', default=5, cast=int)
+    NOTIFY_RETRY_BASE_DELAY = config('NOTIFY_RETRY_BASE_DELAY', default=2.0, cast=float)
+    NOTIFY_RETRY_MAX_DELAY = config('NOTIFY_RETRY_MAX_DELAY', default=300.0, cast=float)
+    # Alert bursts: one notification per (device, status) per window, hourly send budgets per user
+    NOTIFY_COALESCE_SECONDS = config('NOTIFY_COALESCE_SECONDS', default=60.0, cast=float)
+    NOTIFY_EMAIL_BUDGET_PER_HOUR = config('NOTIFY_EMAIL_BUDGET_PER_HOUR', default=20, cast=int)
+    NOTIFY_WHATSAPP_BUDGET_PER_HOUR = config('NOTIFY_WHATSAPP_BUDGET_PER_HOUR', default=10, cast=int)
+    OUTBOX_DRAIN_IN_PROCESS = config('OUTBOX_DRAIN_IN_PROCESS', default=True, cast=bool)
+    OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=50, cast=int)
+    OUTBOX_POLL_INTERVAL = config('OUTBOX_POLL_INTERVAL', default=2.0, cast=float)
+    OUTBOX_LEASE_SECONDS = config('OUTBOX_LEASE_SECONDS', default=120, cast=int)
 
     KNOWN_FACES_DIR = config('KNOWN_FACES_DIR')
     MODEL_NAME = config('MODEL_NAME')
     UNKNOWN_LABEL = config('UNKNOWN_LABEL')
     RECOGNITION_THRESHOLD = config('RECOGNITION_THRESHOLD', cast=float)
-    CONFIDENCE_THRESHOLD = config('CONFIDENCE_THRESHOLD', cast=float)
\ No newline at end of file
+    CONFIDENCE_THRESHOLD = config('CONFIDENCE_THRESHOLD', cast=float)
+
+    # Shared key devices send as X-Device-Key on frame, delta and event posts; unset accepts any registered device
+    DEVICE_API_KEY = config('DEVICE_API_KEY', default='')
+
+    # Event clip capture (pre-roll buffer + post-roll)
+    CLIPS_DIR = config('CLIPS_DIR', default='clips')
+    PREROLL_SECONDS = config('PREROLL_SECONDS', default=5.0, cast=float)
+    POSTROLL_SECONDS = config('POSTROLL_SECONDS', default=5.0, cast=float)
+    # Upper bound on post-roll requested by a device event
+    POSTROLL_MAX_SECONDS = config('POSTROLL_MAX_SECONDS', default=60.0, cast=float)
+    PREROLL_MAX_BYTES = config('PREROLL_MAX_BYTES', default=16 * 1024 * 1024, cast=int)
+    # Longest a clip can be extended by further events, counted from its first event
+    CLIP_MAX_SECONDS = config('CLIP_MAX_SECONDS', default=300.0, cast=float)
+    # Finished clips are pruned per device by age, then oldest first by size
+    CLIP_RETENTION_SECONDS = config('CLIP_RETENTION_SECONDS', default=7 * 24 * 3600, cast=int)
+    CLIP_MAX_BYTES = config('CLIP_MAX_BYTES', default=1024 * 1024 * 1024, cast=int)
+
+    # Segmented frame log for scrubbing recent video
+    FRAME_LOG_ENABLED = config('FRAME_LOG_ENABLED', default=True, cast=bool)
+    FRAME_LOG_DIR = config('FRAME_LOG_DIR', default='frame_logs')
+    FRAME_LOG_SEGMENT_BYTES = config('FRAME_LOG_SEGMENT_BYTES', default=64 * 1024 * 1024, cast=int)
+    FRAME_LOG_MAX_BYTES = config('FRAME_LOG_MAX_BYTES', default=2 * 1024 * 1024 * 1024, cast=int)
+    FRAME_LOG_RETENTION_SECONDS = config('FRAME_LOG_RETENTION_SECONDS', default=6 * 3600, cast=int)
+
+    # Latest-frame store: 'memory' (single process) or 'shared' (multi-process on one box)
+    FRAME_STORE_BACKEND = config('FRAME_STORE_BACKEND', default='memory')
+    FRAME_STORE_SLOT_BYTES = config('FRAME_STORE_SLOT_BYTES', default=2 * 1024 * 1024, cast=int)
@@ -0,0 +1,107 @@
+"""
+Bandwidth and CPU benchmark of the tile delta transport (frame_delta.py)
+against posting every frame as a full JPEG, over a synthetic doorbell scene:
+a static textured background with a person-sized block moving across it.
+
+    python delta_bench.py --frames 300 --width 1280 --height 720 --keyframe-every 30
+
+Server CPU is what /stream/<device_id>/frame and /delta spend before face
+detection: the full-frame path decodes the JPEG for the detector, the delta
+path rebuilds the frame from the tiles and hands the decoded frame on.
+"""
+import time
+import argparse
+import numpy as np
+from frame_delta import (
+    DEFAULT_TILE_SIZE,
+    decode_jpeg,
+    encode_jpeg,
+    encode_delta,
+    parse_tile_key,
+    rebuild_frame
+)
+
+
+def synthetic_frames(count: int, width: int, height: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    background = np.kron(background, np.ones((8, 8, 1), dtype=np.uint8))
+    block_w, block_h = width // 8, height // 2
+    for i in range(count):
+        frame = background.copy()
+        # Mild sensor noise everywhere, so unchanged tiles still differ slightly
+        frame = np.clip(frame.astype(np.int16) + rng.integers(-2, 3, frame.shape), 0, 255).astype(np.uint8)
+        x = (i * 6) % (width - block_w)
+        frame[height // 4:height // 4 + block_h, x:x + block_w] = (40, 90, 160)
+        yield frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--keyframe-every', type=int, default=30)
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE)
+    args = parser.parse_args()
+
+    full_bytes = delta_bytes = 0
+    device_full = device_delta = 0.0
+    server_full = server_delta = server_delta_redecode = 0.0
+    keyframe = None
+    tiles_sent = 0
+
+    for i, frame in enumerate(synthetic_frames(args.frames, args.width, args.height)):
+        # Full frame: device encodes, server decodes for the detector
+        start = time.perf_counter()
+        full = encode_jpeg(frame)
+        device_full += time.perf_counter() - start
+        full_bytes += len(full)
+        start = time.perf_counter()
+        decode_jpeg(full)
+        server_full += time.perf_counter() - start
+
+        if i % args.keyframe_every == 0:
+            start = time.perf_counter()
+            payload = encode_jpeg(frame)
+            device_delta += time.perf_counter() - start
+            delta_bytes += len(payload)
+            start = time.perf_counter()
+            keyframe = decode_jpeg(payload)
+            elapsed = time.perf_counter() - start
+            server_delta += elapsed
+            server_delta_redecode += elapsed
+            reference = frame
+            continue
+
+        start = time.perf_counter()
+        encoded = encode_delta(reference, frame, args.tile_size)
+        device_delta += time.perf_counter() - start
+        delta_bytes += sum(len(b) for b in encoded.values())
+        tiles_sent += len(encoded)
+        tiles = [(*parse_tile_key(key), data) for key, data in encoded.items()]
+
+        start = time.perf_counter()
+        _, img_bytes, _ = rebuild_frame(keyframe, tiles, args.tile_size)
+        elapsed = time.perf_counter() - start
+        server_delta += elapsed
+        # Before the rebuilt frame was handed to the detector it was decoded again
+        start = time.perf_counter()
+        decode_jpeg(img_bytes)
+        server_delta_redecode += elapsed + time.perf_counter() - start
+
+    n = args.frames
+    delta_frames = n - (n + args.keyframe_every - 1) // args.keyframe_every
+    tiles_per_frame = tiles_sent / max(1, delta_frames)
+    print(f"{n} frames {args.width}x{args.height}, keyframe every {args.keyframe_every}, "
+          f"{args.tile_size}px tiles ({tiles_per_frame:.1f} changed per delta)")
+    print(f"{'':<26}{'KB/frame':>10}{'device ms':>12}{'server ms':>12}")
+    print(f"{'full JPEG':<26}{full_bytes / n / 1024:10.1f}{device_full / n * 1000:12.2f}{server_full / n * 1000:12.2f}")
+    print(f"{'delta, re-decoded':<26}{delta_bytes / n / 1024:10.1f}{device_delta / n * 1000:12.2f}"
+          f"{server_delta_redecode / n * 1000:12.2f}")
+    print(f"{'delta, frame handed on':<26}{delta_bytes / n / 1024:10.1f}{device_delta / n * 1000:12.2f}"
+          f"{server_delta / n * 1000:12.2f}")
+
+
+if __name__ == '__main__':
+    main()
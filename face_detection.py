@@ -0,0 +1,162 @@
+import os
+import threading
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from config import Config
+
+try:
+    import gevent
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent = None
+    gevent_monkey = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+
+PROTOTXT_PATH = os.path.join(MODEL_DIR, "deploy.prototxt")
+MODEL_PATH = os.path.join(MODEL_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+
+
+def under_gevent() -> bool:
+    return gevent_monkey is not None and gevent_monkey.is_module_patched('threading')
+
+
+def run_blocking(fn, *args):
+    """
+    Run CPU-bound work such as a DNN forward pass. Under gevent (server.py)
+    it goes to the hub's pool of real OS threads, so streaming greenlets keep
+    running while OpenCV computes; otherwise it runs inline.
+    """
+    if under_gevent():
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+# Load face detection model; a Net must not run forward() from two threads at once.
+# Under gevent the forward pass runs on native threads, so the lock must be native too.
+face_net = cv2.dnn.readNetFromCaffe(PROTOTXT_PATH, MODEL_PATH)
+face_net_lock = gevent_monkey.get_original('_thread', 'allocate_lock')() if under_gevent() else threading.Lock()
+
+# Haar cascades are not part of every OpenCV build; without them crops are not rotated
+if hasattr(cv2, 'CascadeClassifier') and hasattr(cv2, 'data'):
+    eye_cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, 'haarcascade_eye.xml'))
+else:
+    eye_cascade = None
+
+
+def detect_faces_in_frame(frame: np.ndarray, threshold: float = 0.5) -> List[Dict]:
+    """Detect faces in a decoded BGR frame using DNN"""
+    (h, w) = frame.shape[:2]
+    blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0,
+                                 (300, 300), (104.0, 177.0, 123.0))
+    
+    with face_net_lock:
+        face_net.setInput(blob)
+        detections = face_net.forward()
+    
+    faces = []
+    for i in range(0, detections.shape[2]):
+        confidence = detections[0, 0, i, 2]
+        
+        if confidence > threshold:  # Confidence threshold
+            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
+            (startX, startY, endX, endY) = box.astype("int")
+            
+            # Ensure bounding boxes fall within the dimensions of the frame
+            startX = max(0, startX)
+            startY = max(0, startY)
+            endX = min(w, endX)
+            endY = min(h, endY)
+            
+            faces.append({
+                'box': [int(startX), int(startY), int(endX), int(endY)],
+                'confidence': float(confidence)
+            })
+    
+    return faces
+
+
+def detect_faces(frame_bytes, frame: np.ndarray = None):
+    """Detect faces in frame using DNN; pass the decoded frame too, if there is one, to skip decoding"""
+    return run_blocking(_detect_faces, frame_bytes, frame)
+
+
+def _detect_faces(frame_bytes, frame: np.ndarray = None):
+    try:
+        if frame is None:
+            # Convert bytes to numpy array
+            nparr = np.frombuffer(frame_bytes, np.uint8)
+            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if frame is None:
+            return []
+        
+        return detect_faces_in_frame(frame)
+    except Exception as e:
+        print(f"[ERROR] Face detection failed: {e}")
+        return []
+
+
+def align_by_eyes(face: np.ndarray) -> np.ndarray:
+    """Rotate a face crop so the eyes are level, if both eyes can be found"""
+    if eye_cascade is None or eye_cascade.empty():
+        return face
+    gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    upper = gray[:gray.shape[0] // 2]
+    eyes = eye_cascade.detectMultiScale(upper, scaleFactor=1.1, minNeighbors=5)
+    if len(eyes) < 2:
+        return face
+    
+    # Two largest detections, ordered left to right
+    eyes = sorted(sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2], key=lambda e: e[0])
+    (x1, y1, w1, h1), (x2, y2, w2, h2) = eyes
+    left = (x1 + w1 / 2, y1 + h1 / 2)
+    right = (x2 + w2 / 2, y2 + h2 / 2)
+    angle = np.degrees(np.arctan2(right[1] - left[1], right[0] - left[0]))
+    if abs(angle) > 30:
+        return face
+    
+    center = ((left[0] + right[0]) / 2, (left[1] + right[1]) / 2)
+    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    return cv2.warpAffine(face, matrix, (face.shape[1], face.shape[0]), borderMode=cv2.BORDER_REPLICATE)
+
+
+def normalize_face(image_bytes: bytes) -> Optional[Tuple[bytes, List[int]]]:
+    """
+    Detect the most confident face, crop a square around it with a margin,
+    level the eyes and resize to FACE_CROP_SIZE. Returns (jpeg_bytes, crop_box)
+    with the box in original image coordinates, or None if no face is found.
+    """
+    return run_blocking(_normalize_face, image_bytes)
+
+
+def _normalize_face(image_bytes: bytes) -> Optional[Tuple[bytes, List[int]]]:
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    
+    faces = detect_faces_in_frame(image)
+    if not faces:
+        return None
+    
+    h, w = image.shape[:2]
+    x1, y1, x2, y2 = max(faces, key=lambda f: f['confidence'])['box']
+    side = int(max(x2 - x1, y2 - y1) * (1 + 2 * Config.FACE_CROP_MARGIN))
+    side = min(side, w, h)
+    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+    left = min(max(cx - side // 2, 0), w - side)
+    top = min(max(cy - side // 2, 0), h - side)
+    crop_box = [int(left), int(top), int(left + side), int(top + side)]
+    
+    face = image[top:top + side, left:left + side]
+    if face.size == 0:
+        return None
+    face = align_by_eyes(face)
+    face = cv2.resize(face, (Config.FACE_CROP_SIZE, Config.FACE_CROP_SIZE), interpolation=cv2.INTER_AREA)
+    
+    ok, buf = cv2.imencode('.jpg', face, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+    if not ok:
+        return None
+    return buf.tobytes(), crop_box
@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_TILE_SIZE = 64
+DEFAULT_DIFF_THRESHOLD = 8.0
+DEFAULT_JPEG_QUALITY = 80
+
+
+def decode_jpeg(img_bytes: bytes) -> Optional[np.ndarray]:
+    """Decode JPEG bytes into a BGR frame"""
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def encode_jpeg(frame: np.ndarray, quality: int = DEFAULT_JPEG_QUALITY) -> bytes:
+    """Encode a BGR frame as JPEG bytes"""
+    ok, buf = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise RuntimeError('JPEG encoding failed')
+    return buf.tobytes()
+
+
+def tile_key(row: int, col: int) -> str:
+    """Form field name used for a tile at (row, col)"""
+    return f"tile_{row}_{col}"
+
+
+def parse_tile_key(key: str) -> Optional[Tuple[int, int]]:
+    """Parse a tile form field name back into (row, col)"""
+    parts = key.split('_')
+    if len(parts) != 3 or parts[0] != 'tile':
+        return None
+    try:
+        return int(parts[1]), int(parts[2])
+    except ValueError:
+        return None
+
+
+def changed_tiles(reference: np.ndarray, frame: np.ndarray,
+                  tile_size: int = DEFAULT_TILE_SIZE,
+                  threshold: float = DEFAULT_DIFF_THRESHOLD) -> List[Tuple[int, int]]:
+    """
+    Return (row, col) of tiles whose mean absolute difference against the
+    reference frame exceeds the threshold. Used on the device side to pick
+    which tiles to send since the last keyframe.
+    """
+    if reference is None or reference.shape != frame.shape:
+        raise ValueError('Reference frame missing or of a different size')
+
+    h, w = frame.shape[:2]
+    diff = cv2.absdiff(reference, frame)
+    if diff.ndim == 3:
+        diff = diff.mean(axis=2)
+
+    changed = []
+    for row, y in enumerate(range(0, h, tile_size)):
+        for col, x in enumerate(range(0, w, tile_size)):
+            if diff[y:y + tile_size, x:x + tile_size].mean() > threshold:
+                changed.append((row, col))
+    return changed
+
+
+def encode_delta(reference: np.ndarray, frame: np.ndarray,
+                 tile_size: int = DEFAULT_TILE_SIZE,
+                 threshold: float = DEFAULT_DIFF_THRESHOLD,
+                 quality: int = DEFAULT_JPEG_QUALITY) -> Dict[str, bytes]:
+    """Encode the changed tiles of a frame as {tile_key: jpeg_bytes}"""
+    tiles = {}
+    for row, col in changed_tiles(reference, frame, tile_size, threshold):
+        y, x = row * tile_size, col * tile_size
+        tiles[tile_key(row, col)] = encode_jpeg(frame[y:y + tile_size, x:x + tile_size], quality)
+    return tiles
+
+
+def apply_tile(canvas: np.ndarray, row: int, col: int, tile: np.ndarray,
+               tile_size: int = DEFAULT_TILE_SIZE) -> bool:
+    """Paste a decoded tile into the canvas in place. Returns False if it does not fit."""
+    h, w = canvas.shape[:2]
+    y, x = row * tile_size, col * tile_size
+    if y < 0 or x < 0 or y >= h or x >= w:
+        return False
+
+    th = min(tile_size, h - y)
+    tw = min(tile_size, w - x)
+    if tile.shape[0] != th or tile.shape[1] != tw:
+        return False
+
+    canvas[y:y + th, x:x + tw] = tile
+    return True
+
+
+def rebuild_frame(keyframe: np.ndarray, tiles: List[Tuple[int, int, bytes]],
+                  tile_size: int = DEFAULT_TILE_SIZE,
+                  quality: int = DEFAULT_JPEG_QUALITY) -> Tuple[np.ndarray, bytes, int]:
+    """
+    Decode (row, col, jpeg_bytes) tiles onto a copy of the keyframe and encode
+    the result. The keyframe itself is left untouched. Returns the decoded
+    frame, its JPEG bytes and how many tiles were applied.
+    """
+    canvas = keyframe.copy()
+    applied = 0
+    for row, col, tile_bytes in tiles:
+        tile = decode_jpeg(tile_bytes)
+        if tile is not None and apply_tile(canvas, row, col, tile, tile_size):
+            applied += 1
+    return canvas, encode_jpeg(canvas, quality), applied
+
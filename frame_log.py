@@ -0,0 +1,237 @@
+import os
+import mmap
+import fcntl
+import time
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple
+from config import Config
+
+# One index record per stored frame
+INDEX_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('segment', '<u4'),
+    ('offset', '<u4'),
+    ('length', '<u4'),
+])
+
+
+class FrameLog:
+    """
+    Segmented, memory-mapped append-only frame log for one device.
+    Frames are written into fixed-size segment files and located through a
+    compact numpy index of (timestamp, segment, offset, length).
+
+    Every worker process on the box may open the same log directory. Appends
+    hold an exclusive flock on the directory's lock file and first catch up
+    with records other processes added, so there is one writer at a time and
+    the write offset always follows the last record on disk.
+    """
+
+    def __init__(self, log_dir: str, segment_bytes: int, max_bytes: int, max_age: float):
+        self.log_dir = log_dir
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_path = os.path.join(log_dir, 'index.bin')
+        self.lock = threading.Lock()
+        self.segments = {}
+
+        os.makedirs(log_dir, exist_ok=True)
+        # flock is per open file, so threads of this process also take self.lock
+        self.lock_file = open(os.path.join(log_dir, 'lock'), 'a')
+        self.index = np.empty(0, dtype=INDEX_DTYPE)
+        self.index_inode = None
+        self.index_bytes = 0
+        self.current_segment = 0
+        self.write_offset = 0
+        with self.lock:
+            fcntl.flock(self.lock_file, fcntl.LOCK_SH)
+            try:
+                self.sync_index()
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def sync_index(self):
+        """Pick up records appended, or a retention rewrite done, by other processes"""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            st = None
+
+        if st is None:
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+            self.index_inode = None
+            self.index_bytes = 0
+        elif st.st_ino != self.index_inode or st.st_size < self.index_bytes:
+            count = st.st_size // INDEX_DTYPE.itemsize
+            self.index = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count)
+            self.index_inode = st.st_ino
+            self.index_bytes = count * INDEX_DTYPE.itemsize
+        elif st.st_size >= self.index_bytes + INDEX_DTYPE.itemsize:
+            count = (st.st_size - self.index_bytes) // INDEX_DTYPE.itemsize
+            with open(self.index_path, 'rb') as f:
+                f.seek(self.index_bytes)
+                records = np.fromfile(f, dtype=INDEX_DTYPE, count=count)
+            self.index = np.concatenate([self.index, records])
+            self.index_bytes += count * INDEX_DTYPE.itemsize
+
+        if len(self.index):
+            last = self.index[-1]
+            self.current_segment = int(last['segment'])
+            self.write_offset = int(last['offset']) + int(last['length'])
+            first_segment = int(self.index[0]['segment'])
+            for segment in [s for s in self.segments if s < first_segment]:
+                self.segments.pop(segment, None)
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.log_dir, f"seg_{segment:08d}.dat")
+
+    def open_segment(self, segment: int) -> Optional[mmap.mmap]:
+        mm = self.segments.get(segment)
+        if mm is not None:
+            return mm
+
+        path = self.segment_path(segment)
+        if not os.path.exists(path) and segment != self.current_segment:
+            return None
+        with open(path, 'a+b') as f:
+            if os.path.getsize(path) < self.segment_bytes:
+                f.truncate(self.segment_bytes)
+            mm = mmap.mmap(f.fileno(), self.segment_bytes)
+        self.segments[segment] = mm
+        return mm
+
+    def append(self, frame_bytes: bytes, ts: Optional[float] = None) -> bool:
+        length = len(frame_bytes)
+        if length > self.segment_bytes:
+            print(f"[WARN] Frame of {length} bytes exceeds segment size, not logged")
+            return False
+
+        ts = ts if ts is not None else time.time()
+        with self.lock:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            try:
+                self.sync_index()
+                # Drop a partial record left by a writer that died mid-append
+                if os.path.exists(self.index_path) and os.path.getsize(self.index_path) != self.index_bytes:
+                    os.truncate(self.index_path, self.index_bytes)
+
+                if self.write_offset + length > self.segment_bytes:
+                    self.current_segment += 1
+                    self.write_offset = 0
+
+                mm = self.open_segment(self.current_segment)
+                mm[self.write_offset:self.write_offset + length] = frame_bytes
+
+                record = np.array([(ts, self.current_segment, self.write_offset, length)], dtype=INDEX_DTYPE)
+                with open(self.index_path, 'ab') as f:
+                    record.tofile(f)
+                self.index = np.concatenate([self.index, record])
+                self.index_bytes += INDEX_DTYPE.itemsize
+                self.index_inode = os.stat(self.index_path).st_ino
+                self.write_offset += length
+
+                self.apply_retention(ts)
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        return True
+
+    def apply_retention(self, now: float):
+        """Drop whole segments, oldest first, until size and age limits hold"""
+        if not len(self.index):
+            return
+
+        first_segment = int(self.index[0]['segment'])
+        segment_count = self.current_segment - first_segment + 1
+        keep_from = first_segment
+
+        while keep_from < self.current_segment:
+            too_big = (self.current_segment - keep_from + 1) * self.segment_bytes > self.max_bytes
+            seg_end = np.searchsorted(self.index['segment'], keep_from, side='right')
+            too_old = seg_end > 0 and now - self.index[seg_end - 1]['ts'] > self.max_age
+            if not (too_big or too_old):
+                break
+            keep_from += 1
+
+        if keep_from == first_segment:
+            return
+
+        for segment in range(first_segment, keep_from):
+            # In-flight responses may still hold views into the mapping,
+            # so it is left for garbage collection instead of being closed.
+            self.segments.pop(segment, None)
+            try:
+                os.remove(self.segment_path(segment))
+            except FileNotFoundError:
+                pass
+
+        start = np.searchsorted(self.index['segment'], keep_from, side='left')
+        self.index = self.index[start:]
+        tmp_path = self.index_path + '.tmp'
+        self.index.tofile(tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self.index_inode = os.stat(self.index_path).st_ino
+        self.index_bytes = len(self.index) * INDEX_DTYPE.itemsize
+        print(f"[INFO] Frame log retention dropped {keep_from - first_segment} of {segment_count} segment(s)")
+
+    def frame_at(self, ts: float) -> Optional[Tuple[float, memoryview]]:
+        """Latest frame at or before ts, as a memoryview into the segment mapping; copy it to keep it"""
+        with self.lock:
+            fcntl.flock(self.lock_file, fcntl.LOCK_SH)
+            try:
+                self.sync_index()
+                if not len(self.index):
+                    return None
+                pos = np.searchsorted(self.index['ts'], ts, side='right') - 1
+                if pos < 0:
+                    return None
+                entry = self.index[pos]
+                mm = self.open_segment(int(entry['segment']))
+                if mm is None:
+                    return None
+                offset = int(entry['offset'])
+                return float(entry['ts']), memoryview(mm)[offset:offset + int(entry['length'])]
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def time_range(self) -> Optional[Tuple[float, float]]:
+        with self.lock:
+            fcntl.flock(self.lock_file, fcntl.LOCK_SH)
+            try:
+                self.sync_index()
+                if not len(self.index):
+                    return None
+                return float(self.index[0]['ts']), float(self.index[-1]['ts'])
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+
+device_frame_logs: Dict[str, FrameLog] = {}
+device_frame_logs_lock = threading.Lock()
+
+
+def get_frame_log(device_id: str) -> FrameLog:
+    with device_frame_logs_lock:
+        log = device_frame_logs.get(device_id)
+        if log is None:
+            safe_id = "".join(c for c in str(device_id) if c.isalnum() or c in ('-', '_')) or 'unknown'
+            log = FrameLog(
+                os.path.join(Config.FRAME_LOG_DIR, safe_id),
+                Config.FRAME_LOG_SEGMENT_BYTES,
+                Config.FRAME_LOG_MAX_BYTES,
+                Config.FRAME_LOG_RETENTION_SECONDS
+            )
+            device_frame_logs[device_id] = log
+        return log
+
+
+def log_frame(device_id: str, frame_bytes: bytes, ts: Optional[float] = None) -> bool:
+    """Append a frame to the device's log if the frame log is enabled"""
+    if not Config.FRAME_LOG_ENABLED:
+        return False
+    try:
+        return get_frame_log(device_id).append(frame_bytes, ts)
+    except OSError as e:
+        print(f"[ERROR] Failed to append to frame log: {e}")
+        return False
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import fcntl
+import struct
+import hashlib
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from multiprocessing import shared_memory, resource_tracker
+from config import Config
+
+
+class InProcessFrameStore:
+    """Latest frame per device kept in a module-level dict (single process only)"""
+
+    def __init__(self):
+        self.streams = {}
+        self.detections = {}
+        self.lock = threading.Lock()
+
+    def init_stream(self, device_id: str, user_id: str = None):
+        with self.lock:
+            self.streams[device_id] = {
+                'frame': None,
+                'timestamp': None,
+                'user_id': user_id,
+                'last_update': datetime.utcnow()
+            }
+
+    def put_frame(self, device_id: str, frame_bytes: bytes):
+        now = datetime.utcnow()
+        with self.lock:
+            stream = self.streams.setdefault(device_id, {'frame': None, 'timestamp': None, 'user_id': None})
+            stream['frame'] = frame_bytes
+            stream['timestamp'] = now
+            stream['last_update'] = now
+
+    def get_stream(self, device_id: str, include_frame: bool = True) -> Optional[Dict]:
+        with self.lock:
+            stream = self.streams.get(device_id)
+            if stream is None:
+                return None
+            info = dict(stream)
+        info['has_frame'] = info['frame'] is not None
+        if not include_frame:
+            info['frame'] = None
+        return info
+
+    def put_detections(self, device_id: str, detections: Dict):
+        with self.lock:
+            self.detections[device_id] = detections
+
+    def get_detections(self, device_id: str) -> Optional[Dict]:
+        with self.lock:
+            return self.detections.get(device_id)
+
+    def remove(self, device_id: str):
+        with self.lock:
+            self.streams.pop(device_id, None)
+            self.detections.pop(device_id, None)
+
+
+# Shared segment layout: header | detections JSON | frame bytes
+# The owner field holds the raw JWT identity, which is a JSON document
+HEADER_FORMAT = '<QddIII988s'
+HEADER_SIZE = 1024
+DETECTIONS_SIZE = 4096
+DATA_OFFSET = HEADER_SIZE + DETECTIONS_SIZE
+
+
+class SharedMemoryFrameStore:
+    """
+    Latest frame per device kept in a named shared memory segment so every
+    worker process on the box sees the same frames. Writers are serialized
+    with a per-device file lock; readers use a sequence counter and retry
+    if a write happened while they were copying.
+    """
+
+    def __init__(self, slot_bytes: int, prefix: str = 'dbell'):
+        self.slot_bytes = slot_bytes
+        self.prefix = prefix
+        self.segments = {}
+        self.lock = threading.Lock()
+        self.lock_dir = os.path.join(tempfile.gettempdir(), f"{prefix}_frame_locks")
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+    def segment_name(self, device_id: str) -> str:
+        digest = hashlib.sha1(str(device_id).encode()).hexdigest()[:16]
+        return f"{self.prefix}_{digest}"
+
+    def attach(self, device_id: str, create: bool = False) -> Optional[shared_memory.SharedMemory]:
+        with self.lock:
+            shm = self.segments.get(device_id)
+            if shm is not None:
+                return shm
+
+            name = self.segment_name(device_id)
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+                # Segments outlive the attaching process; stop the resource
+                # tracker from unlinking them when this worker exits.
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            except FileNotFoundError:
+                if not create:
+                    return None
+                try:
+                    shm = shared_memory.SharedMemory(name=name, create=True, size=DATA_OFFSET + self.slot_bytes)
+                    resource_tracker.unregister(shm._name, 'shared_memory')
+                    shm.buf[:DATA_OFFSET] = bytes(DATA_OFFSET)
+                except FileExistsError:
+                    shm = shared_memory.SharedMemory(name=name)
+                    resource_tracker.unregister(shm._name, 'shared_memory')
+
+            self.segments[device_id] = shm
+            return shm
+
+    def write_lock(self, device_id: str):
+        return open(os.path.join(self.lock_dir, self.segment_name(device_id)), 'a')
+
+    def read_header(self, shm):
+        seq, ts, last_update, length, det_length, active, user_id = struct.unpack_from(HEADER_FORMAT, shm.buf, 0)
+        return seq, ts, last_update, length, det_length, active, user_id.rstrip(b'\0').decode()
+
+    def update(self, device_id: str, frame_bytes: bytes = None, user_id: str = None,
+               detections: Dict = None, reset: bool = False, active: bool = True):
+        shm = self.attach(device_id, create=True)
+        det_bytes = json.dumps(detections, default=str).encode() if detections is not None else None
+        if det_bytes is not None and len(det_bytes) > DETECTIONS_SIZE:
+            det_bytes = None
+            print(f"[WARN] Detections for {device_id} exceed shared slot, not stored")
+        if frame_bytes is not None and len(frame_bytes) > self.slot_bytes:
+            print(f"[WARN] Frame of {len(frame_bytes)} bytes exceeds shared slot, not stored")
+            return
+
+        with self.write_lock(device_id) as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            seq, ts, last_update, length, det_length, is_active, current_user = self.read_header(shm)
+            # Odd marks a write in progress. A writer killed mid-update leaves seq
+            # odd, so the next writer forces parity rather than adding to it.
+            seq |= 1
+            struct.pack_into('<Q', shm.buf, 0, seq)
+
+            now = time.time()
+            if reset:
+                ts, length, det_length = 0.0, 0, 0
+            if user_id is not None or reset:
+                current_user = user_id or ''
+            if frame_bytes is not None:
+                shm.buf[DATA_OFFSET:DATA_OFFSET + len(frame_bytes)] = frame_bytes
+                length = len(frame_bytes)
+                ts = now
+            if det_bytes is not None:
+                shm.buf[HEADER_SIZE:HEADER_SIZE + len(det_bytes)] = det_bytes
+                det_length = len(det_bytes)
+
+            if frame_bytes is not None or reset:
+                is_active = int(active)
+
+            struct.pack_into(HEADER_FORMAT, shm.buf, 0, seq + 1, ts, now, length, det_length,
+                             is_active, current_user.encode()[:988])
+
+    def snapshot(self, device_id: str, include_frame: bool, include_detections: bool):
+        shm = self.attach(device_id)
+        if shm is None:
+            return None
+
+        spins = 0
+        while True:
+            seq, ts, last_update, length, det_length, active, user_id = self.read_header(shm)
+            if seq % 2:
+                spins += 1
+                if spins % 1000 == 0:
+                    self.repair_abandoned(device_id, shm)
+                time.sleep(0)
+                continue
+            frame = bytes(shm.buf[DATA_OFFSET:DATA_OFFSET + length]) if include_frame and length else None
+            det = bytes(shm.buf[HEADER_SIZE:HEADER_SIZE + det_length]) if include_detections and det_length else None
+            if struct.unpack_from('<Q', shm.buf, 0)[0] == seq:
+                if not active:
+                    return None
+                return ts, last_update, length, user_id, frame, det
+
+    def repair_abandoned(self, device_id: str, shm):
+        """Close out a write whose writer died, so readers stop waiting on it"""
+        with self.write_lock(device_id) as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            seq = struct.unpack_from('<Q', shm.buf, 0)[0]
+            if seq % 2:
+                print(f"[WARN] Repairing abandoned frame store write for {device_id}")
+                struct.pack_into('<Q', shm.buf, 0, seq + 1)
+
+    def init_stream(self, device_id: str, user_id: str = None):
+        self.update(device_id, user_id=user_id, reset=True)
+
+    def put_frame(self, device_id: str, frame_bytes: bytes):
+        self.update(device_id, frame_bytes=frame_bytes)
+
+    def get_stream(self, device_id: str, include_frame: bool = True) -> Optional[Dict]:
+        snap = self.snapshot(device_id, include_frame, False)
+        if snap is None:
+            return None
+        ts, last_update, length, user_id, frame, _ = snap
+        return {
+            'frame': frame,
+            'has_frame': length > 0,
+            'timestamp': datetime.utcfromtimestamp(ts) if length else None,
+            'user_id': user_id or None,
+            'last_update': datetime.utcfromtimestamp(last_update) if last_update else None
+        }
+
+    def put_detections(self, device_id: str, detections: Dict):
+        self.update(device_id, detections=detections)
+
+    def get_detections(self, device_id: str) -> Optional[Dict]:
+        snap = self.snapshot(device_id, False, True)
+        if snap is None or snap[5] is None:
+            return None
+        return json.loads(snap[5])
+
+    def remove(self, device_id: str):
+        # Other workers keep the segment mapped, so it is marked inactive
+        # rather than unlinked.
+        if self.attach(device_id) is None:
+            return
+        self.update(device_id, reset=True, active=False)
+
+
+_frame_store = None
+_frame_store_lock = threading.Lock()
+
+
+def get_frame_store():
+    """Process-wide frame store selected by FRAME_STORE_BACKEND ('memory' or 'shared')"""
+    global _frame_store
+    with _frame_store_lock:
+        if _frame_store is None:
+            if Config.FRAME_STORE_BACKEND == 'shared':
+                _frame_store = SharedMemoryFrameStore(Config.FRAME_STORE_SLOT_BYTES)
+            else:
+                _frame_store = InProcessFrameStore()
+        return _frame_store
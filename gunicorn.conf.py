@@ -0,0 +1,27 @@
+from decouple import config
+
+# Greenlet workers: each connection is a greenlet, not an OS thread.
+bind = f"{config('SERVER_HOST', default='0.0.0.0')}:{config('SERVER_PORT', default=5000, cast=int)}"
+workers = config('SERVER_WORKERS', default=1, cast=int)
+worker_class = 'gevent'
+worker_connections = config('SERVER_WORKER_CONNECTIONS', default=5000, cast=int)
+timeout = config('SERVER_TIMEOUT', default=120, cast=int)
+keepalive = 5
+
+# With FRAME_STORE_BACKEND=shared every worker sees the latest frame, and frame
+# logs are safe to share (appends take a file lock). Delta keyframes, pre-roll
+# buffers and active clips stay in the worker that received the device's posts,
+# so a device whose posts are spread over workers gets endless 409s on deltas
+# and clips with holes. More than one worker is therefore only allowed when
+# DEVICE_STICKY_ROUTING says each device's posts reach a single worker, e.g.
+# devices post to a separate SERVER_WORKERS=1 instance on the same box.
+if workers > 1:
+    problems = []
+    if config('FRAME_STORE_BACKEND', default='memory') != 'shared':
+        problems.append("FRAME_STORE_BACKEND=shared")
+    if not config('DEVICE_STICKY_ROUTING', default=False, cast=bool):
+        problems.append("DEVICE_STICKY_ROUTING=True (each device's posts reach one worker)")
+    if problems:
+        print(f"[ERROR] SERVER_WORKERS={workers} requires {' and '.join(problems)}; "
+              f"run with SERVER_WORKERS=1 otherwise")
+        raise SystemExit(1)
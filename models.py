@@ -84,6 +84,11 @@ class WatchlistMember(db.Model):
 
 class FaceImage(db.Model):
     __tablename__ = 'face_image'
+    __table_args__ = (
+        # Objects are content-addressed, so one row per member and hash keeps
+        # each object owned by a single row
+        db.Index('uq_face_image_member_content_hash', 'member_id', 'content_hash', unique=True),
+    )
 
     id = db.Column(
         UUID(as_uuid=True),
@@ -100,6 +105,11 @@ class FaceImage(db.Model):
     path = db.Column(db.String(500), nullable=True)
     supabase_path = db.Column(db.String(500), nullable=True)
     filename = db.Column(db.String(100), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    # Aligned, size-normalized face crop stored next to the original
+    face_path = db.Column(db.String(500), nullable=True)
+    face_box = db.Column(db.JSON, nullable=True)
+    size = db.Column(db.Integer, nullable=True)
 
     uploaded_at = db.Column(
         db.DateTime(timezone=True),
@@ -107,8 +117,107 @@ class FaceImage(db.Model):
     )
 
 
+class WatchlistChange(db.Model):
+    """Append-only log of watchlist image changes; the id is the device manifest version"""
+    __tablename__ = 'watchlist_change'
+    __table_args__ = (
+        db.Index('ix_watchlist_change_device_version', 'device_id', 'id'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+
+    device_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey('device.id'),
+        nullable=False
+    )
+
+    # No foreign key: deletions outlive the image row
+    image_id = db.Column(UUID(as_uuid=True), nullable=False)
+    member_id = db.Column(UUID(as_uuid=True), nullable=True)
+    op = db.Column(db.String(10), nullable=False)
+    supabase_path = db.Column(db.String(500), nullable=True)
+    face_path = db.Column(db.String(500), nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)
+    size = db.Column(db.Integer, nullable=True)
+
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        server_default=func.now()
+    )
+
+
+class ImportJob(db.Model):
+    """Progress of a bulk watchlist import, shared by every worker that may be polled"""
+    __tablename__ = 'import_job'
+
+    id = db.Column(db.String(32), primary_key=True)
+
+    user_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey('user.id'),
+        nullable=False
+    )
+
+    archive = db.Column(db.String(255), nullable=True)
+    # queued -> running -> completed | failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    processed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    uploaded = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    duplicates = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    failed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    members_created = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    faces_queued = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    faces_done = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    errors = db.Column(db.JSON, nullable=False, default=list)
+
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        server_default=func.now()
+    )
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+
+class CapturedImage(db.Model):
+    __tablename__ = 'captured_image'
+    __table_args__ = (
+        db.Index('ix_captured_image_device_created', 'device_id', 'created_at'),
+        db.Index('ix_captured_image_status', 'status'),
+    )
+
+    id = db.Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        server_default=func.gen_random_uuid()
+    )
+
+    device_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey('device.id'),
+        nullable=False
+    )
+
+    person_name = db.Column(db.String(100), nullable=False, default='Unknown')
+    status = db.Column(db.String(20), nullable=False, default='unrecognized')
+    filename = db.Column(db.String(255), nullable=False)
+    supabase_path = db.Column(db.String(500), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=True)
+    size = db.Column(db.Integer, nullable=True)
+    # True when the capture was suppressed/deduplicated and points at an earlier object
+    is_reference = db.Column(db.Boolean, default=False)
+
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        server_default=func.now()
+    )
+
+
 class Notification(db.Model):
     __tablename__ = 'notification'
+    __table_args__ = (
+        db.Index('ix_notification_user_timestamp', 'user_id', 'timestamp', 'id'),
+    )
 
     id = db.Column(
         UUID(as_uuid=True),
@@ -122,10 +231,18 @@ class Notification(db.Model):
         nullable=False
     )
 
+    device_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey('device.id'),
+        nullable=True
+    )
+
     person_name = db.Column(db.String(100), nullable=False)
     status = db.Column(db.String(20), nullable=False)
     confidence = db.Column(db.Float)
     image_path = db.Column(db.String(255))
+    # Device events merged into this notification by the alert coalescer
+    event_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     timestamp = db.Column(
         db.DateTime(timezone=True),
@@ -133,6 +250,44 @@ class Notification(db.Model):
     )
 
 
+class NotificationOutbox(db.Model):
+    """Pending deliveries, written in the same transaction as their Notification"""
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        server_default=func.gen_random_uuid()
+    )
+
+    notification_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey('notification.id'),
+        nullable=False
+    )
+
+    channel = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    # pending -> sending (leased until next_attempt_at) -> sent | failed
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+    next_attempt_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now()
+    )
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        server_default=func.now()
+    )
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+
 class DoorLock(db.Model):
     __tablename__ = 'door_lock'
     id = db.Column(
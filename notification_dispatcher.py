@@ -0,0 +1,90 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+
+class NotificationDispatcher:
+    """
+    Background delivery of notifications. Each channel has its own queue and
+    worker threads, so the worker count is the channel's concurrency limit
+    and a slow provider never holds up the other channels. A submitted send
+    is attempted once and its outcome returned in a Future; retries are the
+    caller's (the outbox's) business.
+    """
+
+    def __init__(self):
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def register_channel(self, name: str, handler: Callable[..., bool], concurrency: int):
+        with self.lock:
+            self.channels[name] = {
+                'handler': handler,
+                'concurrency': max(1, concurrency),
+                'queue': queue.Queue(),
+                'workers': [],
+                'busy': 0
+            }
+
+    def _ensure_workers(self, channel: Dict, name: str):
+        with self.lock:
+            channel['workers'] = [w for w in channel['workers'] if w.is_alive()]
+            while len(channel['workers']) < channel['concurrency']:
+                worker = threading.Thread(
+                    target=self._worker, args=(name, channel),
+                    name=f"notify-{name}-{len(channel['workers'])}", daemon=True
+                )
+                worker.start()
+                channel['workers'].append(worker)
+
+    def _worker(self, name: str, channel: Dict):
+        while True:
+            notification_id, kwargs, future = channel['queue'].get()
+            if not future.set_running_or_notify_cancel():
+                # Cancelled by the outbox before it started; the row stays reclaimable
+                channel['queue'].task_done()
+                continue
+            with self.lock:
+                channel['busy'] += 1
+            try:
+                sent = channel['handler'](**kwargs)
+            except Exception as e:
+                print(f"[ERROR] {name} delivery for notification {notification_id} raised: {e}")
+                sent = False
+            finally:
+                with self.lock:
+                    channel['busy'] -= 1
+            try:
+                future.set_result(bool(sent))
+            finally:
+                channel['queue'].task_done()
+
+    def submit(self, name: str, notification_id, **kwargs) -> Future:
+        """Queue one delivery attempt on a channel; the Future resolves to whether it was sent"""
+        channel = self._channel(name)
+        future = Future()
+        channel['queue'].put((notification_id, kwargs, future))
+        return future
+
+    def _channel(self, name: str) -> Dict:
+        channel = self.channels.get(name)
+        if channel is None:
+            raise KeyError(f"Unknown notification channel: {name}")
+        self._ensure_workers(channel, name)
+        return channel
+
+    def capacity(self) -> Dict[str, int]:
+        """Idle workers per channel, i.e. how many more sends would start straight away"""
+        with self.lock:
+            return {
+                name: max(0, channel['concurrency'] - channel['busy'] - channel['queue'].qsize())
+                for name, channel in self.channels.items()
+            }
+
+    def pending(self) -> Dict[str, int]:
+        """Approximate number of queued deliveries per channel"""
+        return {name: channel['queue'].qsize() for name, channel in self.channels.items()}
+
+
+dispatcher = NotificationDispatcher()
@@ -0,0 +1,156 @@
+import random
+import threading
+from datetime import timedelta
+from functools import partial
+from concurrent.futures import wait
+from flask import current_app
+from typing import Dict
+from config import Config
+from models import db, NotificationOutbox
+from notification_dispatcher import dispatcher
+
+# Set after a commit adds outbox rows so the drainer skips its poll delay
+_wakeup = threading.Event()
+_drainer = None
+_drainer_lock = threading.Lock()
+
+
+def add_to_outbox(notification_id, channel: str, payload: Dict) -> NotificationOutbox:
+    """Stage a delivery in the caller's transaction; it is sent once that commits"""
+    row = NotificationOutbox(
+        notification_id=notification_id,
+        channel=channel,
+        payload=payload,
+        status='pending',
+        attempts=0
+    )
+    db.session.add(row)
+    return row
+
+
+def wake_drainer():
+    _wakeup.set()
+
+
+def _claim_batch(limits: Dict[str, int], batch_size: int):
+    """
+    Lock due rows, skipping rows other drainers hold, and lease them by
+    pushing next_attempt_at forward. Each channel gets at most its limit
+    (its idle workers), so every claimed send starts straight away and the
+    lease only has to outlast one send. A drainer that dies mid-batch leaves
+    its rows to be reclaimed once the lease runs out. Rows for channels with
+    no registered handler are claimed too, so they can be failed.
+    """
+    due = NotificationOutbox.query.filter(
+        NotificationOutbox.status.in_(('pending', 'sending')),
+        NotificationOutbox.next_attempt_at <= db.func.now()
+    )
+    rows = []
+    for channel, limit in limits.items():
+        if limit <= 0:
+            continue
+        rows += due.filter(NotificationOutbox.channel == channel).order_by(
+            NotificationOutbox.next_attempt_at
+        ).limit(min(limit, batch_size)).with_for_update(skip_locked=True).all()
+    rows += due.filter(NotificationOutbox.channel.notin_(list(limits))).order_by(
+        NotificationOutbox.next_attempt_at
+    ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    batch = [(row.id, row.notification_id, row.channel, row.payload, row.attempts) for row in rows]
+    for row in rows:
+        row.status = 'sending'
+        row.next_attempt_at = db.func.now() + timedelta(seconds=Config.OUTBOX_LEASE_SECONDS)
+    db.session.commit()
+    return batch
+
+
+def _failure_changes(row_id, attempts: int, error: str) -> Dict:
+    attempts += 1
+    if attempts > Config.NOTIFY_MAX_RETRIES:
+        print(f"[ERROR] Giving up outbox delivery {row_id} after {attempts} attempts")
+        return {'status': 'failed', 'attempts': attempts, 'last_error': error}
+    delay = random.uniform(0, min(Config.NOTIFY_RETRY_MAX_DELAY,
+                                  Config.NOTIFY_RETRY_BASE_DELAY * 2 ** (attempts - 1)))
+    return {
+        'status': 'pending',
+        'attempts': attempts,
+        'last_error': error,
+        'next_attempt_at': db.func.now() + timedelta(seconds=delay)
+    }
+
+
+def _record_outcome(app, row_id, attempts: int, future):
+    """Done-callback: store a send's outcome whenever it finishes, even after drain_once returned"""
+    if future.cancelled():
+        # Never started, so nothing was sent: hand the row straight back
+        changes = {'status': 'pending', 'next_attempt_at': db.func.now()}
+    elif future.result():
+        changes = {'status': 'sent', 'sent_at': db.func.now(), 'last_error': None}
+    else:
+        changes = _failure_changes(row_id, attempts, 'send failed')
+    with app.app_context():
+        try:
+            NotificationOutbox.query.filter_by(id=row_id).update(changes, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            print(f"[ERROR] Failed to record outbox delivery {row_id}: {e}")
+            db.session.rollback()
+
+
+def drain_once(batch_size: int = None) -> int:
+    """Deliver one batch of due outbox rows; returns how many rows were claimed"""
+    batch = _claim_batch(dispatcher.capacity(), batch_size or Config.OUTBOX_BATCH_SIZE)
+    if not batch:
+        return 0
+
+    app = current_app._get_current_object()
+    futures = []
+    for row_id, notification_id, channel, payload, attempts in batch:
+        try:
+            future = dispatcher.submit(channel, notification_id, **payload)
+        except KeyError as e:
+            NotificationOutbox.query.filter_by(id=row_id).update(
+                _failure_changes(row_id, attempts, str(e)), synchronize_session=False
+            )
+            db.session.commit()
+            continue
+        future.add_done_callback(partial(_record_outcome, app, row_id, attempts))
+        futures.append(future)
+
+    # Sends that have not started by the deadline are cancelled and released;
+    # started ones keep running and record their own outcome when they finish
+    _, not_done = wait(futures, timeout=Config.OUTBOX_LEASE_SECONDS)
+    for future in not_done:
+        future.cancel()
+    return len(batch)
+
+
+def _drain_loop(app):
+    while True:
+        _wakeup.clear()
+        try:
+            with app.app_context():
+                claimed = drain_once()
+        except Exception as e:
+            print(f"[ERROR] Outbox drain failed: {e}")
+            with app.app_context():
+                db.session.rollback()
+            claimed = 0
+        if not claimed:
+            _wakeup.wait(Config.OUTBOX_POLL_INTERVAL)
+
+
+def start_outbox_drainer(app):
+    """Run the drainer on a daemon thread; any number of processes may run one"""
+    global _drainer
+    with _drainer_lock:
+        if _drainer is None or not _drainer.is_alive():
+            _drainer = threading.Thread(target=_drain_loop, args=(app,), name='notification-outbox', daemon=True)
+            _drainer.start()
+
+
+if __name__ == '__main__':
+    # Standalone drainer, e.g. with OUTBOX_DRAIN_IN_PROCESS=False on the web workers
+    from app import app
+    print("[INFO] Draining notification outbox")
+    _drain_loop(app)
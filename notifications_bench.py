@@ -0,0 +1,143 @@
+"""
+Send-throughput benchmark for notifications_service.py against local stub
+provider servers: a fresh connection or client per send (the old behaviour)
+versus the pooled session and Twilio client.
+
+    python notifications_bench.py --sends 300 --threads 4 --latency-ms 20
+
+Nothing leaves the machine; SendGrid, Maileroo and Twilio calls are routed
+to a stub HTTP server on 127.0.0.1.
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """Answers SendGrid, Maileroo and Twilio message calls with keep-alive"""
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed ACKs
+    # stall every keep-alive response and the pooled runs look slower
+    disable_nagle_algorithm = True
+    latency = 0.0
+    connections = 0
+    connections_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.connections_lock:
+            StubProviderHandler.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.path.endswith('/Messages.json'):
+            status, body = 201, json.dumps({'sid': 'SM' + '0' * 32, 'status': 'queued'})
+        elif self.path.startswith('/v3/mail/send'):
+            status, body = 202, ''
+        else:
+            reference_id = json.loads(payload).get('reference_id')
+            status, body = 200, json.dumps({'success': True, 'message': 'queued',
+                                            'data': {'reference_id': reference_id}})
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(latency: float) -> ThreadingHTTPServer:
+    StubProviderHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubProviderHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(label: str, send, sends: int, threads: int):
+    StubProviderHandler.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(send, range(sends)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {sends / elapsed:8.1f} sends/s  {StubProviderHandler.connections:5d} TCP connections")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sends', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated provider time per request')
+    args = parser.parse_args()
+
+    server = start_stub(args.latency_ms / 1000.0)
+    stub_url = f'http://127.0.0.1:{server.server_port}'
+    os.environ.setdefault('SENDGRID_API_KEY', 'SG.bench')
+    os.environ.setdefault('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+    os.environ.setdefault('TWILIO_AUTH_TOKEN', 'bench')
+    os.environ.setdefault('TWILIO_WHATSAPP_FROM', 'whatsapp:+15550000000')
+
+    import requests
+    from twilio.rest import Client as TwilioClient
+    from twilio.http.http_client import TwilioHttpClient
+    import notifications_service as ns
+
+    class StubTwilioHttpClient(TwilioHttpClient):
+        def request(self, method, url, *a, **kw):
+            return super().request(method, url.replace('https://api.twilio.com', stub_url), *a, **kw)
+
+    ns.SENDGRID_SEND_URL = f'{stub_url}/v3/mail/send'
+    ns.MAILEROO_API_URL = f'{stub_url}/api/v2/'
+
+    def fresh_pools():
+        # Each pooled run starts cold so its connection count is its own
+        ns.reset_clients()
+        ns._twilio_client = TwilioClient(
+            ns.TWILIO_ACCOUNT_SID, ns.TWILIO_AUTH_TOKEN,
+            http_client=StubTwilioHttpClient(pool_connections=True, timeout=ns.HTTP_TIMEOUT[1])
+        )
+
+    html = '<p>Someone is at the door</p>'
+
+    def email_per_call(i):
+        resp = requests.post(ns.SENDGRID_SEND_URL, json={'subject': 'Doorbell', 'html': html},
+                             headers={'Authorization': f'Bearer {ns.SENDGRID_API_KEY}'}, timeout=ns.HTTP_TIMEOUT)
+        resp.raise_for_status()
+
+    def email_pooled(i):
+        ns.send_email('owner@example.com', 'Doorbell', html)
+
+    def maileroo_pooled(i):
+        ns.send_maileroo_email('bench', 'no-reply@example.com', 'owner@example.com', 'Doorbell', html=html)
+
+    def whatsapp_per_call(i):
+        client = TwilioClient(ns.TWILIO_ACCOUNT_SID, ns.TWILIO_AUTH_TOKEN,
+                              http_client=StubTwilioHttpClient(timeout=ns.HTTP_TIMEOUT[1]))
+        client.messages.create(body='Doorbell', from_=ns.TWILIO_WHATSAPP_FROM, to='whatsapp:+15551111111')
+
+    def whatsapp_pooled(i):
+        ns.send_whatsapp('+15551111111', 'Doorbell')
+
+    print(f"{args.sends} sends, {args.threads} threads, {args.latency_ms} ms simulated latency")
+    run('email per-call', email_per_call, args.sends, args.threads)
+    fresh_pools()
+    run('email pooled', email_pooled, args.sends, args.threads)
+    fresh_pools()
+    run('maileroo pooled', maileroo_pooled, args.sends, args.threads)
+    run('whatsapp per-call', whatsapp_per_call, args.sends, args.threads)
+    fresh_pools()
+    run('whatsapp pooled', whatsapp_pooled, args.sends, args.threads)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,27 @@
 import os
+import threading
 from typing import Optional
 
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-from twilio.rest import Client as TwilioClient
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+try:
+    from sendgrid.helpers.mail import Mail
+except ImportError:
+    Mail = None
+try:
+    from maileroo import EmailAddress, MailerooClient
+except ImportError:
+    EmailAddress = None
+    MailerooClient = None
+try:
+    from twilio.rest import Client as TwilioClient
+    from twilio.http.http_client import TwilioHttpClient
+except ImportError:
+    TwilioClient = None
+    TwilioHttpClient = None
+
 load_dotenv()
 
 
@@ -14,20 +30,126 @@ TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 TWILIO_WHATSAPP_FROM = os.getenv('TWILIO_WHATSAPP_FROM')  # e.g. 'whatsapp:+1415xxxxxxx'
 
+SENDGRID_SEND_URL = 'https://api.sendgrid.com/v3/mail/send'
+MAILEROO_API_URL = 'https://smtp.maileroo.com/api/v2/'
+
+# (connect, read) timeouts for every provider call
+HTTP_TIMEOUT = (float(os.getenv('NOTIFY_CONNECT_TIMEOUT', '5')), float(os.getenv('NOTIFY_READ_TIMEOUT', '15')))
+HTTP_POOL_SIZE = int(os.getenv('NOTIFY_HTTP_POOL_SIZE', '10'))
+
+# Long-lived clients with keep-alive pools, shared by all threads of a process
+_session = None
+_twilio_client = None
+_clients_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session() -> requests.Session:
+    """Process-wide pooled session for provider and webhook calls; pass HTTP_TIMEOUT per request"""
+    global _session
+    if _session is None:
+        with _clients_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get_twilio_client():
+    global _twilio_client
+    if _twilio_client is None:
+        with _clients_lock:
+            if _twilio_client is None:
+                http_client = TwilioHttpClient(pool_connections=True, timeout=HTTP_TIMEOUT[1])
+                _twilio_client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=http_client)
+    return _twilio_client
+
+
+def reset_clients():
+    """Drop pooled clients, e.g. in a forked child that must not share sockets"""
+    global _session, _twilio_client
+    _session = None
+    _twilio_client = None
+
+os.register_at_fork(after_in_child=reset_clients)
+
+
+def whatsapp_configured() -> bool:
+    return bool(TwilioClient and TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_FROM)
+
 
 def send_email(to_email: str, subject: str, html_content: str, from_email: str = None) -> dict:
     if not SENDGRID_API_KEY:
         raise RuntimeError('SENDGRID_API_KEY must be set')
+    if Mail is None:
+        raise RuntimeError('sendgrid is not installed')
     from_email = from_email or os.getenv('DEFAULT_FROM_EMAIL') or 'no-reply@example.com'
     message = Mail(from_email=from_email, to_emails=to_email, subject=subject, html_content=html_content)
-    sg = SendGridAPIClient(SENDGRID_API_KEY)
-    resp = sg.send(message)
-    return {'status_code': resp.status_code, 'body': getattr(resp, 'body', None)}
+    resp = get_http_session().post(
+        SENDGRID_SEND_URL,
+        json=message.get(),
+        headers={'Authorization': f'Bearer {SENDGRID_API_KEY}'},
+        timeout=HTTP_TIMEOUT
+    )
+    resp.raise_for_status()
+    return {'status_code': resp.status_code, 'body': resp.text}
+
+
+if MailerooClient is not None:
+    class PooledMailerooClient(MailerooClient):
+        """
+        The Maileroo SDK builds and validates the request; only the transport is
+        swapped for the pooled session. The SDK posts with a new connection per
+        call. _send_request is the SDK's single HTTP call, so maileroo is pinned
+        in requirements.txt.
+        """
+
+        def _send_request(self, method, endpoint, data=None):
+            body_or_params = {'params': data or {}} if method.upper() == 'GET' else {'json': data or {}}
+            resp = get_http_session().request(
+                method,
+                MAILEROO_API_URL + endpoint.lstrip('/'),
+                **body_or_params,
+                headers={'Authorization': f'Bearer {self._api_key}'},
+                timeout=HTTP_TIMEOUT
+            )
+            try:
+                body = resp.json() if resp.text else {}
+            except ValueError:
+                resp.raise_for_status()
+                raise RuntimeError('Maileroo response is not valid JSON')
+            if not isinstance(body, dict) or not isinstance(body.get('success'), bool):
+                resp.raise_for_status()
+                raise RuntimeError('Maileroo response is missing the "success" field')
+            body.setdefault('message', 'Unknown')
+            return body
+
+
+def send_maileroo_email(api_key: str, from_email: str, to_email: str, subject: str,
+                        html: Optional[str] = None, text: Optional[str] = None) -> str:
+    """Send through the Maileroo SDK over the pooled session; returns the reference id"""
+    if MailerooClient is None:
+        raise RuntimeError('maileroo is not installed')
+    email = {
+        'from': EmailAddress(from_email),
+        'to': EmailAddress(to_email),
+        'subject': subject
+    }
+    if html is not None:
+        email['html'] = html
+    if text is not None:
+        email['plain'] = text
+    return PooledMailerooClient(api_key).send_basic_email(email)
 
 
 def send_whatsapp(to_number: str, message_body: str) -> dict:
-    if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_FROM):
+    if not whatsapp_configured():
         raise RuntimeError('Twilio credentials and TWILIO_WHATSAPP_FROM must be set')
-    client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-    msg = client.messages.create(body=message_body, from_=TWILIO_WHATSAPP_FROM, to=f'whatsapp:{to_number}')
+    msg = get_twilio_client().messages.create(body=message_body, from_=TWILIO_WHATSAPP_FROM, to=f'whatsapp:{to_number}')
     return {'sid': msg.sid, 'status': msg.status}
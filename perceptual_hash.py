@@ -0,0 +1,54 @@
+import time
+import threading
+from collections import deque
+from typing import Dict, Optional
+import cv2
+import numpy as np
+from config import Config
+from face_detection import run_blocking
+
+
+def dhash(img_bytes: bytes, hash_size: int = 8) -> Optional[int]:
+    """Difference hash of an encoded image as a hash_size*hash_size bit integer"""
+    return run_blocking(_dhash, img_bytes, hash_size)
+
+
+def _dhash(img_bytes: bytes, hash_size: int) -> Optional[int]:
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    gray = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+# Recent captures per device: (timestamp, hash, person, status, upload result)
+device_capture_windows = {}
+device_capture_windows_lock = threading.Lock()
+
+
+def find_similar_capture(device_id: str, image_hash: int, person_name: str, status: str) -> Optional[Dict]:
+    """Upload result of a recent capture of the same person/status within the Hamming threshold"""
+    now = time.time()
+    with device_capture_windows_lock:
+        window = device_capture_windows.get(device_id)
+        if not window:
+            return None
+        while window and now - window[0][0] > Config.PHASH_WINDOW_SECONDS:
+            window.popleft()
+        for ts, other_hash, other_person, other_status, result in reversed(window):
+            if (other_person == person_name and other_status == status and
+                    hamming_distance(image_hash, other_hash) <= Config.PHASH_MAX_DISTANCE):
+                return result
+    return None
+
+
+def remember_capture(device_id: str, image_hash: int, person_name: str, status: str, result: Dict):
+    with device_capture_windows_lock:
+        window = device_capture_windows.setdefault(device_id, deque(maxlen=Config.PHASH_WINDOW_SIZE))
+        window.append((time.time(), image_hash, person_name, status, result))
@@ -0,0 +1,40 @@
+"""
+Production entry point using gevent greenlets instead of one OS thread per
+connection, so long-lived /stream/<device_id>/live viewers and long-polls
+share a handful of threads.
+
+    python server.py
+    gunicorn -c gunicorn.conf.py server:app
+
+Face detection runs on gevent's native thread pool (see face_detection.py).
+stream_load_test.py measures server memory per live viewer.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+try:
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+except ImportError:
+    print("[WARN] psycogreen not installed, database calls will block the event loop")
+
+from gevent.pywsgi import WSGIServer
+from gevent.pool import Pool
+from decouple import config
+from config import Config
+from app import app
+from notification_outbox import start_outbox_drainer
+
+# Deliver outbox rows left over from before a restart, and new ones as they
+# commit. Module level, so each gunicorn worker importing server:app runs one.
+if Config.OUTBOX_DRAIN_IN_PROCESS:
+    start_outbox_drainer(app)
+
+if __name__ == '__main__':
+    host = config('SERVER_HOST', default='0.0.0.0')
+    port = config('SERVER_PORT', default=5000, cast=int)
+    max_connections = config('SERVER_WORKER_CONNECTIONS', default=5000, cast=int)
+
+    print(f"[INFO] Serving on {host}:{port} with gevent (max {max_connections} connections)")
+    server = WSGIServer((host, port), app, spawn=Pool(max_connections))
+    server.serve_forever()
@@ -0,0 +1,115 @@
+"""
+Benchmark of storage calls against a local stand-in for the Supabase storage
+API: a client built per call (the old get_client behaviour) versus the pooled
+process-wide client in supabase_client.py.
+
+    python storage_bench.py --calls 500 --threads 8 --latency-ms 5
+
+Nothing leaves the machine; SUPABASE_URL is pointed at the stub server.
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubStorageHandler(BaseHTTPRequestHandler):
+    """Answers object uploads and listings the way the storage API does, with keep-alive"""
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    connections = 0
+    connections_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.connections_lock:
+            StubStorageHandler.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.path.startswith('/storage/v1/object/list/'):
+            body = json.dumps([{'name': f'img_{i}.jpg', 'id': str(i)} for i in range(10)])
+        else:
+            body = json.dumps({'Key': self.path.split('/storage/v1/object/', 1)[-1]})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(latency: float) -> ThreadingHTTPServer:
+    StubStorageHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubStorageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(label: str, call, calls: int, threads: int):
+    StubStorageHandler.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(call, range(calls)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {calls / elapsed:8.1f} calls/s  {StubStorageHandler.connections:5d} TCP connections")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated server time per request')
+    args = parser.parse_args()
+
+    server = start_stub(args.latency_ms / 1000.0)
+    url = f'http://127.0.0.1:{server.server_port}'
+    os.environ['SUPABASE_URL'] = url
+    os.environ.setdefault('SUPABASE_KEY', 'bench-key')
+    # Config requires these at import; the benchmark never touches the database
+    for name in ('SECRET_KEY', 'SUPABASE_DB_USER', 'SUPABASE_DB_PASSWORD', 'SUPABASE_DB_HOST',
+                 'SUPABASE_DB_NAME', 'AT_USERNAME', 'AT_API_KEY', 'AT_VIRTUAL_NUMBER',
+                 'OWNER_PHONE_NUMBER', 'BASE_URL', 'KNOWN_FACES_DIR', 'MODEL_NAME', 'UNKNOWN_LABEL'):
+        os.environ.setdefault(name, 'bench')
+    for name in ('SUPABASE_DB_PORT', 'RECOGNITION_THRESHOLD', 'CONFIDENCE_THRESHOLD'):
+        os.environ.setdefault(name, '0')
+
+    from supabase import create_client
+    from config import Config
+    from supabase_client import get_client, upload_to_supabase, iter_bucket_files
+
+    payload = os.urandom(16 * 1024)
+
+    def upload_per_call(i):
+        create_client(url, Config.SUPABASE_KEY).storage.from_('bench').upload(
+            f'per_call/{i}.jpg', payload, {'content-type': 'image/jpeg'})
+
+    def upload_pooled(i):
+        upload_to_supabase('bench', f'pooled/{i}.jpg', payload, 'image/jpeg')
+
+    def list_per_call(i):
+        create_client(url, Config.SUPABASE_KEY).storage.from_('bench').list(path='dev')
+
+    def list_pooled(i):
+        list(iter_bucket_files('bench', 'dev'))
+
+    get_client()
+    print(f"{args.calls} calls, {args.threads} threads, {args.latency_ms} ms simulated latency")
+    run('upload per-call', upload_per_call, args.calls, args.threads)
+    run('upload pooled', upload_pooled, args.calls, args.threads)
+    run('list per-call', list_per_call, args.calls, args.threads)
+    run('list pooled', list_pooled, args.calls, args.threads)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import queue
+import threading
+from typing import List, Set
+from flask import current_app
+from config import Config
+from models import db, FaceImage
+from thumbnails import invalidate_thumbnails
+from supabase_client import (
+    delete_files,
+    watchlist_image_path,
+    mark_pending_deletion,
+    claim_pending_deletion,
+    finish_deletion
+)
+
+# Pending (app, bucket, paths, attempt) deletions, drained by a background thread
+cleanup_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _referenced_paths(paths: List[str]) -> Set[str]:
+    """Watchlist paths some FaceImage row still points at, e.g. another row with the same bytes"""
+    # Older rows may store paths without the device folder
+    candidates = {path: {path, path.split('/', 1)[-1]} for path in paths}
+    names = set().union(*candidates.values())
+    used = set()
+    for supabase_path, face_path in db.session.query(FaceImage.supabase_path, FaceImage.face_path).filter(
+        db.or_(FaceImage.supabase_path.in_(names), FaceImage.face_path.in_(names))
+    ):
+        used.update((supabase_path, face_path))
+    return {path for path, path_names in candidates.items() if path_names & used}
+
+
+def _cleanup_worker():
+    while True:
+        app, bucket, paths, attempt = cleanup_queue.get()
+        # Paths re-uploaded since they were queued are skipped
+        paths = claim_pending_deletion(bucket, paths)
+        try:
+            if app is not None and paths:
+                # Content-addressed objects can be shared; keep any a row still uses
+                with app.app_context():
+                    referenced = _referenced_paths(paths)
+                if referenced:
+                    print(f"[INFO] Keeping {len(referenced)} object(s) still referenced in {bucket}")
+                    finish_deletion(bucket, list(referenced))
+                    paths = [path for path in paths if path not in referenced]
+            failed = delete_files(bucket, paths, batch_size=Config.STORAGE_DELETE_BATCH_SIZE) if paths else []
+            invalidate_thumbnails(bucket, [path for path in paths if path not in failed])
+            if failed:
+                if attempt < Config.STORAGE_DELETE_RETRIES:
+                    delay = 2 ** attempt
+                    print(f"[WARN] {len(failed)} storage deletion(s) failed, retrying in {delay}s")
+                    mark_pending_deletion(bucket, failed)
+                    threading.Timer(delay, cleanup_queue.put, args=((app, bucket, failed, attempt + 1),)).start()
+                else:
+                    print(f"[ERROR] Giving up deleting {len(failed)} object(s) from {bucket}: {failed[:5]}")
+        except Exception as e:
+            print(f"[ERROR] Storage cleanup failed: {e}")
+        finally:
+            finish_deletion(bucket, paths)
+            cleanup_queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_cleanup_worker, name='storage-cleanup', daemon=True)
+            _worker.start()
+
+
+def enqueue_watchlist_deletion(device_id: str, image_paths: List[str]):
+    """
+    Queue watchlist images of a device for background deletion. Call it after
+    the rows are deleted; objects another FaceImage row still uses are kept.
+    """
+    enqueue_deletion('images', [watchlist_image_path(device_id, p) for p in image_paths if p],
+                     app=current_app._get_current_object())
+
+
+def enqueue_deletion(bucket: str, paths: List[str], app=None):
+    """
+    Delete storage objects in the background, in batches, with retries. With
+    an app, objects still referenced by a FaceImage row are not deleted.
+    """
+    paths = [p for p in paths if p]
+    if not paths:
+        return
+    _ensure_worker()
+    mark_pending_deletion(bucket, paths)
+    cleanup_queue.put((app, bucket, paths, 0))
@@ -0,0 +1,137 @@
+"""
+Load test for /api/video/stream/<device_id>/live: opens many MJPEG viewers
+against a running server and reports how much server memory each one costs.
+
+    python stream_load_test.py --url http://127.0.0.1:5000 --device test-device \
+        --viewers 100,500,1000 --pid <server or gunicorn master pid>
+
+A device must be posting frames to the stream while this runs (e.g.
+--feed some.jpg posts that image in a loop). Server RSS is read from /proc
+for --pid and all of its children, so run it on the server's host.
+"""
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from urllib.parse import urlsplit
+
+import requests
+
+
+def process_tree_rss(pid: int) -> int:
+    """Resident set size in bytes of pid and all of its descendants"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def feed_frames(url: str, device_id: str, jpeg_path: str, fps: float, stop: threading.Event):
+    with open(jpeg_path, 'rb') as f:
+        frame = f.read()
+    session = requests.Session()
+    while not stop.is_set():
+        try:
+            session.post(f'{url}/api/video/stream/{device_id}/frame',
+                         files={'frame': ('frame.jpg', frame, 'image/jpeg')}, timeout=10)
+        except requests.RequestException as e:
+            print(f"[WARN] Feeding frame failed: {e}")
+        stop.wait(1.0 / fps)
+
+
+async def viewer(host: str, port: int, path: str, counters: dict, stop: asyncio.Event):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        counters['failed'] += 1
+        return
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n'.encode())
+    await writer.drain()
+    counters['connected'] += 1
+    try:
+        while not stop.is_set():
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            counters['bytes'] += len(chunk)
+            counters['frames'] += chunk.count(b'--frame')
+    except OSError:
+        pass
+    finally:
+        counters['connected'] -= 1
+        writer.close()
+
+
+async def run_step(host: str, port: int, path: str, viewers: int, hold: float, pid: int, baseline: int):
+    counters = {'connected': 0, 'failed': 0, 'bytes': 0, 'frames': 0}
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(viewer(host, port, path, counters, stop)) for _ in range(viewers)]
+
+    # Let connections settle before sampling
+    await asyncio.sleep(hold)
+    frames_before = counters['frames']
+    await asyncio.sleep(hold)
+    rss = process_tree_rss(pid) if pid else 0
+    connected = counters['connected']
+    fps_per_viewer = (counters['frames'] - frames_before) / hold / max(connected, 1)
+
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    line = (f"viewers={viewers} connected={connected} failed={counters['failed']} "
+            f"fps/viewer={fps_per_viewer:.1f}")
+    if pid:
+        per_viewer = (rss - baseline) / max(connected, 1)
+        per_gb = (1024 ** 3) / per_viewer if per_viewer > 0 else float('inf')
+        line += (f" server_rss={rss / 1024 ** 2:.1f}MB per_viewer={per_viewer / 1024:.1f}KB "
+                 f"viewers_per_GB={per_gb:.0f}")
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--device', default='load-test-device')
+    parser.add_argument('--viewers', default='50,200,500', help='comma-separated viewer counts')
+    parser.add_argument('--hold', type=float, default=10.0, help='seconds to settle and to measure each step')
+    parser.add_argument('--pid', type=int, help='server pid whose process tree RSS is sampled')
+    parser.add_argument('--feed', help='JPEG to post as the device frame while testing')
+    parser.add_argument('--feed-fps', type=float, default=10.0)
+    args = parser.parse_args()
+
+    parts = urlsplit(args.url)
+    host, port = parts.hostname, parts.port or 80
+    path = f'/api/video/stream/{args.device}/live'
+
+    stop_feed = threading.Event()
+    if args.feed:
+        threading.Thread(target=feed_frames, args=(args.url, args.device, args.feed, args.feed_fps, stop_feed),
+                         daemon=True).start()
+        time.sleep(1)
+
+    baseline = process_tree_rss(args.pid) if args.pid else 0
+    if args.pid:
+        print(f"baseline server_rss={baseline / 1024 ** 2:.1f}MB")
+    try:
+        for count in (int(v) for v in args.viewers.split(',') if v.strip()):
+            asyncio.run(run_step(host, port, path, count, args.hold, args.pid, baseline))
+    finally:
+        stop_feed.set()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import hashlib
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Iterator, Tuple
+from flask import Request
+from config import Config
+
+CHUNK_SIZE = 64 * 1024
+
+
+class SpoolingRequest(Request):
+    """Request whose uploaded files spill to disk above UPLOAD_SPOOL_THRESHOLD"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=Config.UPLOAD_SPOOL_THRESHOLD, mode='rb+')
+
+
+def spool_stream(stream: BinaryIO, max_bytes: int = None) -> Tuple[SpooledTemporaryFile, str, int]:
+    """
+    Copy a request body into a spooled temp file in chunks, hashing on the way.
+    Returns (file, sha256, size) with the file rewound.
+    """
+    spooled = SpooledTemporaryFile(max_size=Config.UPLOAD_SPOOL_THRESHOLD, mode='rb+')
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            spooled.close()
+            raise ValueError('Upload too large')
+        digest.update(chunk)
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled, digest.hexdigest(), size
+
+
+def file_sha256(fileobj: BinaryIO) -> str:
+    """SHA-256 of a seekable file, read in chunks; the file is rewound afterwards"""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def file_size(fileobj: BinaryIO) -> int:
+    fileobj.seek(0, 2)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+def read_all(fileobj: BinaryIO) -> bytes:
+    """Read a seekable file fully for consumers that need the whole image, then rewind"""
+    fileobj.seek(0)
+    data = fileobj.read()
+    fileobj.seek(0)
+    return data
+
+
+def iter_chunks(fileobj: BinaryIO) -> Iterator[bytes]:
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        yield chunk
@@ -1,57 +1,277 @@
 import os
 import io
-import uuid
-from typing import List, Dict, Optional
-from supabase import create_client, Client
+import time
+import hashlib
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterator, List, Dict, Optional
+from urllib.parse import quote
+import httpx
+from supabase import create_client, Client, ClientOptions
 from config import Config
+from streaming import file_sha256, file_size, iter_chunks, read_all
 import mimetypes
 
+# Process-wide client sharing one pooled keep-alive HTTP transport
+_client = None
+_http_client = None
+_client_lock = threading.Lock()
+
+def _build_client() -> Client:
+    global _http_client
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=Config.SUPABASE_POOL_SIZE,
+            max_keepalive_connections=Config.SUPABASE_POOL_SIZE
+        ),
+        timeout=httpx.Timeout(Config.SUPABASE_TIMEOUT, connect=Config.SUPABASE_CONNECT_TIMEOUT)
+    )
+    # The sync ClientOptions; the base dataclass in supabase.lib has no httpx_client
+    options = ClientOptions(
+        httpx_client=http_client,
+        storage_client_timeout=Config.SUPABASE_TIMEOUT,
+        postgrest_client_timeout=Config.SUPABASE_TIMEOUT
+    )
+
+    client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY, options=options)
+    # Build the lazily created storage client now so threads never race on it
+    client.storage
+    # Streaming uploads go straight to the storage REST API over the same pool
+    _http_client = http_client
+    return client
+
 def get_client() -> Client:
-    """Get Supabase client instance"""
+    """Get the shared Supabase client instance"""
+    global _client
     if not Config.SUPABASE_URL or not Config.SUPABASE_KEY:
         raise RuntimeError('SUPABASE_URL and SUPABASE_KEY must be set in environment')
-    return create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+def reset_client():
+    """Drop the shared client, e.g. in a forked worker that must not reuse parent sockets"""
+    global _client, _http_client
+    _client = None
+    _http_client = None
+
+os.register_at_fork(after_in_child=reset_client)
+
+def compute_content_hash(file_bytes) -> str:
+    """SHA-256 of the uploaded bytes (or seekable file), used for content-addressed names and dedup"""
+    if not isinstance(file_bytes, (bytes, bytearray)):
+        return file_sha256(file_bytes)
+    return hashlib.sha256(file_bytes).hexdigest()
+
+class StorageUploadError(RuntimeError):
+    """Failed storage upload; status is the storage API's HTTP status, None for transport errors"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
 
-def upload_to_supabase(bucket: str, path: str, file_bytes: bytes, content_type: str = None) -> Dict:
+def storage_error_status(error: Exception) -> Optional[int]:
+    """HTTP status carried by a storage API error (storage3 reports it as str or int)"""
+    status = getattr(error, 'status', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable_error(error: Exception) -> bool:
+    """Transport failures and 5xx responses are worth retrying; other 4xx are not"""
+    status = storage_error_status(error)
+    if status is not None:
+        return status >= 500
+    cause = error.__cause__ or error
+    return isinstance(cause, (httpx.TransportError, ConnectionError, TimeoutError))
+
+def is_duplicate_error(error: Exception) -> bool:
+    """The storage API reports an existing object as statusCode 409"""
+    return storage_error_status(error) == 409
+
+def _stream_upload(bucket: str, path: str, fileobj: BinaryIO, content_type: str):
+    """Upload a seekable file to the storage REST API in chunks instead of one bytes object"""
+    get_client()
+    url = f"{Config.SUPABASE_URL.rstrip('/')}/storage/v1/object/{quote(bucket)}/{quote(path)}"
+    headers = {
+        'Authorization': f"Bearer {Config.SUPABASE_KEY}",
+        'apikey': Config.SUPABASE_KEY,
+        'Content-Type': content_type,
+        'Content-Length': str(file_size(fileobj)),
+        'x-upsert': 'false'
+    }
+    response = _http_client.post(url, content=iter_chunks(fileobj), headers=headers)
+    if response.status_code >= 400:
+        # The storage API reports conflicts as HTTP 400 with statusCode 409 in the body
+        try:
+            status = int(response.json().get('statusCode', response.status_code))
+        except (ValueError, TypeError, AttributeError):
+            status = response.status_code
+        raise StorageUploadError(f"{status} {response.text}", status)
+
+def upload_to_supabase(bucket: str, path: str, file_bytes, content_type: str = None,
+                       allow_existing: bool = False) -> Dict:
+    """Upload bytes, or stream a seekable file object, to a bucket"""
     sup = get_client()
 
     if not content_type:
         content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
 
+    # Otherwise a queued delete of an earlier object at this path removes the new upload
+    cancel_pending_deletion(bucket, path)
+
+    existing = False
     try:
-        res = sup.storage.from_(bucket).upload(
-            path,
-            file_bytes,
-            {"content-type": content_type}
-        )
+        if isinstance(file_bytes, (bytes, bytearray)):
+            res = sup.storage.from_(bucket).upload(
+                path,
+                file_bytes,
+                {"content-type": content_type}
+            )
+        else:
+            _stream_upload(bucket, path, file_bytes, content_type)
 
     except Exception as e:
-        raise RuntimeError(f"Storage upload failed: {str(e)}")
+        # Content-addressed paths that already exist hold the same bytes
+        if not (allow_existing and is_duplicate_error(e)):
+            raise StorageUploadError(f"Storage upload failed: {str(e)}", storage_error_status(e)) from e
+        existing = True
 
 
-    public_url = sup.storage.from_(bucket).get_public_url(path)
+    public_url = build_public_url(bucket, path)
 
     return {
         "success": True,
         "path": path,
         "public_url": public_url,
-        "bucket": bucket
+        "bucket": bucket,
+        "existing": existing
     }
 
+def iter_bucket_files(bucket: str, prefix: str = '', page_size: int = None,
+                      prefetch: bool = False) -> Iterator[Dict]:
+    """
+    Yield the entries under a prefix page by page instead of relying on the
+    storage API's default page size. With prefetch, the next page is fetched
+    in the background while the current one is consumed. Errors are raised.
+    """
+    page_size = page_size or Config.STORAGE_LIST_PAGE_SIZE
+    storage = get_client().storage.from_(bucket)
+
+    def fetch(offset):
+        return storage.list(path=prefix, options={
+            'limit': page_size,
+            'offset': offset,
+            'sortBy': {'column': 'name', 'order': 'asc'}
+        })
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        offset = 0
+        page = fetch(offset)
+        while page:
+            full_page = len(page) == page_size
+            next_page = executor.submit(fetch, offset + page_size) if executor and full_page else None
+
+            for entry in page:
+                yield entry
+
+            if not full_page:
+                break
+            offset += page_size
+            page = next_page.result() if next_page else fetch(offset)
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
 def list_files_in_bucket(bucket: str, prefix: str = '') -> List[Dict]:
     """List files in a bucket with optional prefix"""
-    sup = get_client()
     try:
-        list_res = sup.storage.from_(bucket).list(path=prefix)
-        return list_res
+        return list(iter_bucket_files(bucket, prefix, prefetch=True))
     except Exception as e:
         print(f"[ERROR] Failed to list files: {e}")
         return []
 
+@lru_cache(maxsize=8192)
+def build_public_url(bucket: str, path: str) -> str:
+    """Build the public object URL locally; it is a pure function of SUPABASE_URL, bucket and path"""
+    base = Config.SUPABASE_URL.rstrip('/')
+    return f"{base}/storage/v1/object/public/{quote(bucket)}/{quote(path.lstrip('/'))}"
+
 def get_public_url(bucket: str, path: str) -> str:
     """Get public URL for a file"""
+    return build_public_url(bucket, path)
+
+# Signed URLs need the project JWT secret, so they come from the storage API
+# and are cached until shortly before they expire.
+_signed_url_cache = {}
+_signed_url_lock = threading.Lock()
+SIGNED_URL_REFRESH_MARGIN = 60
+SIGNED_URL_CACHE_SIZE = 10000
+
+def _cached_signed_url(bucket: str, path: str, expires_in: int) -> Optional[str]:
+    with _signed_url_lock:
+        entry = _signed_url_cache.get((bucket, path, expires_in))
+    if entry and entry[1] > time.time():
+        return entry[0]
+    return None
+
+def _store_signed_url(bucket: str, path: str, expires_in: int, url: str):
+    now = time.time()
+    valid_until = now + max(expires_in - SIGNED_URL_REFRESH_MARGIN, 0)
+    with _signed_url_lock:
+        if len(_signed_url_cache) >= SIGNED_URL_CACHE_SIZE:
+            for key in [k for k, v in _signed_url_cache.items() if v[1] <= now]:
+                del _signed_url_cache[key]
+            if len(_signed_url_cache) >= SIGNED_URL_CACHE_SIZE:
+                _signed_url_cache.clear()
+        _signed_url_cache[(bucket, path, expires_in)] = (url, valid_until)
+
+def get_signed_url(bucket: str, path: str, expires_in: int = 3600) -> Optional[str]:
+    """Get a signed URL for a file, served from cache while still valid"""
+    return get_signed_urls(bucket, [path], expires_in).get(path)
+
+def get_signed_urls(bucket: str, paths: List[str], expires_in: int = 3600) -> Dict[str, str]:
+    """Get signed URLs for many files with at most one storage call for the cache misses"""
+    urls = {}
+    missing = []
+    for path in paths:
+        url = _cached_signed_url(bucket, path, expires_in)
+        if url:
+            urls[path] = url
+        else:
+            missing.append(path)
+
+    if not missing:
+        return urls
+
+    sup = get_client()
+    try:
+        results = sup.storage.from_(bucket).create_signed_urls(missing, expires_in)
+    except Exception as e:
+        print(f"[ERROR] Failed to create signed URLs: {e}")
+        return urls
+
+    for item in results:
+        url = item.get('signedURL') or item.get('signedUrl')
+        if item.get('path') and url and not item.get('error'):
+            _store_signed_url(bucket, item['path'], expires_in, url)
+            urls[item['path']] = url
+    return urls
+
+def download_file(bucket: str, path: str) -> Optional[bytes]:
+    """Download a file from Supabase storage"""
     sup = get_client()
-    return sup.storage.from_(bucket).get_public_url(path)
+    try:
+        return sup.storage.from_(bucket).download(path)
+    except Exception as e:
+        print(f"[ERROR] Failed to download file: {e}")
+        return None
 
 def delete_file(bucket: str, path: str) -> bool:
     """Delete file from Supabase storage"""
@@ -63,73 +283,227 @@ def delete_file(bucket: str, path: str) -> bool:
         print(f"[ERROR] Failed to delete file: {e}")
         return False
 
+def delete_files(bucket: str, paths: List[str], batch_size: int = 100) -> List[str]:
+    """Delete many files with one remove() call per batch; returns the paths that failed"""
+    sup = get_client()
+    failed = []
+    for i in range(0, len(paths), batch_size):
+        batch = paths[i:i + batch_size]
+        try:
+            sup.storage.from_(bucket).remove(batch)
+        except Exception as e:
+            print(f"[ERROR] Failed to delete {len(batch)} file(s): {e}")
+            failed.extend(batch)
+    return failed
+
+# Queued background deletions by (bucket, path), so an upload can take its path back.
+# Counts are queued deletions not yet picked up; in-flight ones are in _deleting_paths.
+_pending_deletions = {}
+_deleting_paths = set()
+_deletions_cond = threading.Condition()
+
+def mark_pending_deletion(bucket: str, paths: List[str]):
+    with _deletions_cond:
+        for path in paths:
+            key = (bucket, path)
+            _pending_deletions[key] = _pending_deletions.get(key, 0) + 1
+
+def claim_pending_deletion(bucket: str, paths: List[str]) -> List[str]:
+    """Paths of a queued deletion that no upload has cancelled since; they are now in flight"""
+    claimed = []
+    with _deletions_cond:
+        for path in paths:
+            key = (bucket, path)
+            count = _pending_deletions.get(key, 0)
+            if not count:
+                continue
+            if count == 1:
+                del _pending_deletions[key]
+            else:
+                _pending_deletions[key] = count - 1
+            _deleting_paths.add(key)
+            claimed.append(path)
+    return claimed
+
+def finish_deletion(bucket: str, paths: List[str]):
+    with _deletions_cond:
+        for path in paths:
+            _deleting_paths.discard((bucket, path))
+        _deletions_cond.notify_all()
+
+def cancel_pending_deletion(bucket: str, path: str):
+    """Drop queued deletions of a path about to be uploaded and wait out one already in flight"""
+    key = (bucket, path)
+    with _deletions_cond:
+        _pending_deletions.pop(key, None)
+        _deletions_cond.wait_for(lambda: key not in _deleting_paths, timeout=Config.SUPABASE_TIMEOUT)
+
 # Image-specific functions
 def upload_watchlist_image(user_id: str, device_id: str, watchlist_id: str, 
-                          watchlist_name: str, file_bytes: bytes, 
-                          filename: str, content_type: str = 'image/jpeg') -> Dict:
+                          watchlist_name: str, file_bytes, 
+                          filename: str, content_type: str = 'image/jpeg',
+                          content_hash: str = None) -> Dict:
     """Upload watchlist image to Supabase images bucket"""
     # Sanitize watchlist name for filename
     safe_watchlist_name = "".join(c for c in watchlist_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
     safe_watchlist_name = safe_watchlist_name.replace(' ', '_')
     
-    # Generate unique filename
+    # Content-addressed filename: the same bytes map to the same object
+    content_hash = content_hash or compute_content_hash(file_bytes)
     file_ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'jpg'
-    unique_filename = f"{watchlist_id}_{safe_watchlist_name}_{uuid.uuid4().hex[:8]}.{file_ext}"
+    unique_filename = f"{watchlist_id}_{safe_watchlist_name}_{content_hash[:16]}.{file_ext}"
     
-    # Path format: deviceID/watchlistId_watchlistName.ext
+    # Path format: deviceID/watchlistId_watchlistName_hash.ext
     path = f"{device_id}/{unique_filename}"
     
-    return upload_to_supabase('images', path, file_bytes, content_type)
+    result = upload_to_supabase('images', path, file_bytes, content_type, allow_existing=True)
+    result['content_hash'] = content_hash
+    result['size'] = len(file_bytes) if isinstance(file_bytes, (bytes, bytearray)) else file_size(file_bytes)
+    return result
+
+def upload_with_retry(upload_fn, *args, retries: int = None, **kwargs) -> Dict:
+    """Call an upload helper, retrying transport errors and 5xx responses with exponential backoff"""
+    retries = Config.UPLOAD_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            return upload_fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not is_retryable_error(e):
+                raise
+            delay = 0.5 * (2 ** attempt)
+            print(f"[WARN] Upload failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+FACE_CROP_SUFFIX = '_face.jpg'
+
+def face_crop_path(path: str) -> str:
+    """Storage path of the normalized face crop stored next to an original"""
+    return f"{path.rsplit('.', 1)[0]}{FACE_CROP_SUFFIX}"
+
+def upload_watchlist_images(user_id: str, device_id: str, watchlist_id: str,
+                            watchlist_name: str, files: List[Dict],
+                            max_workers: int = None,
+                            derive_face: Callable = None) -> List[Dict]:
+    """
+    Upload several watchlist images with bounded concurrency.
+    Each entry of files has filename, file_bytes and content_type; the result
+    keeps the input order and carries either the upload result or an error.
+    Instead of file_bytes an entry may carry a seekable stream, which is
+    uploaded in chunks. With derive_face, a (crop_bytes, crop_box) derivative
+    is uploaded next to each original and reported under result['face'].
+    """
+    max_workers = max_workers or Config.UPLOAD_CONCURRENCY
+
+    def upload_one(item):
+        try:
+            result = upload_with_retry(
+                upload_watchlist_image,
+                user_id=user_id,
+                device_id=device_id,
+                watchlist_id=watchlist_id,
+                watchlist_name=watchlist_name,
+                file_bytes=item['stream'] if 'stream' in item else item['file_bytes'],
+                filename=item['filename'],
+                content_type=item.get('content_type') or 'image/jpeg',
+                content_hash=item.get('content_hash')
+            )
+        except Exception as e:
+            print(f"[ERROR] Error uploading image {item['filename']}: {e}")
+            return {'filename': item['filename'], 'error': str(e), 'status': storage_error_status(e)}
+
+        if derive_face:
+            # The original is already stored; a missing crop is not an error
+            try:
+                # Decoding needs the whole image; it is held only for this step
+                image_bytes = read_all(item['stream']) if 'stream' in item else item['file_bytes']
+                derived = derive_face(image_bytes)
+                if derived:
+                    crop_bytes, crop_box = derived
+                    crop = upload_with_retry(
+                        upload_to_supabase, 'images', face_crop_path(result['path']),
+                        crop_bytes, 'image/jpeg', allow_existing=True
+                    )
+                    result['face'] = {'path': crop['path'], 'public_url': crop['public_url'], 'box': crop_box}
+            except Exception as e:
+                print(f"[WARN] Face normalization failed for {item['filename']}: {e}")
+        return {'filename': item['filename'], 'result': result}
+
+    if not files:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(files))) as pool:
+        return list(pool.map(upload_one, files))
+
+# Recently uploaded captured faces by (device_id, content_hash)
+_captured_hashes = OrderedDict()
+_captured_hashes_lock = threading.Lock()
+CAPTURED_HASH_CACHE_SIZE = 4096
 
 def upload_captured_face(device_id: str, person_name: str, status: str, 
-                        file_bytes: bytes, filename: str = None) -> Dict:
-    """Upload captured face to Supabase captured-faces bucket"""
+                        file_bytes, filename: str = None, content_hash: str = None) -> Dict:
+    """Upload captured face (bytes or a seekable file) to Supabase captured-faces bucket"""
+    content_hash = content_hash or compute_content_hash(file_bytes)
+    key = (str(device_id), content_hash)
+    with _captured_hashes_lock:
+        previous = _captured_hashes.get(key)
+        if previous:
+            _captured_hashes.move_to_end(key)
+    if previous:
+        # Identical bytes were already stored for this device
+        return dict(previous, deduplicated=True)
+    
     # Generate filename
-    timestamp = uuid.uuid4().hex[:8]
+    timestamp = content_hash[:16]
     safe_person_name = "".join(c for c in person_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
     safe_person_name = safe_person_name.replace(' ', '_')
     
+    # Only a name derived from the content hash is known to hold these bytes if it
+    # already exists; a reused device-chosen name with other bytes is a conflict.
+    content_addressed = not filename
     if not filename:
         filename = f"{safe_person_name}_{status}_{timestamp}.jpg"
     
     # Path format: deviceID/timestamp_person_status.ext
     path = f"{device_id}/{filename}"
     
-    return upload_to_supabase('captured-faces', path, file_bytes, 'image/jpeg')
+    result = upload_to_supabase('captured-faces', path, file_bytes, 'image/jpeg',
+                                allow_existing=content_addressed)
+    result['content_hash'] = content_hash
+    with _captured_hashes_lock:
+        _captured_hashes[key] = result
+        while len(_captured_hashes) > CAPTURED_HASH_CACHE_SIZE:
+            _captured_hashes.popitem(last=False)
+    return result
+
+def iter_watchlist_images_for_device(device_id: str) -> Iterator[Dict]:
+    """Yield watchlist images for a device page by page; listing errors are raised"""
+    for file_info in iter_bucket_files('images', device_id, prefetch=True):
+        if not file_info.get('name'):
+            continue
+        # Storage returns names relative to the listed folder
+        name = file_info['name']
+        path = name if name.startswith(f"{device_id}/") else f"{device_id}/{name}"
+        yield {
+            'path': path,
+            'url': build_public_url('images', path),
+            'filename': path.split('/')[-1],
+            'size': (file_info.get('metadata') or {}).get('size'),
+            'created_at': file_info.get('created_at')
+        }
 
 def get_watchlist_images_for_device(device_id: str) -> List[Dict]:
     """Get all watchlist images for a specific device"""
-    sup = get_client()
     try:
-        # List all files in the device's folder
-        files = sup.storage.from_('images').list(path=device_id)
-        
-        images = []
-        for file_info in files:
-            if file_info.get('name'):
-                # Get public URL
-                path = file_info['name']
-                try:
-                    public_url = sup.storage.from_('images').get_public_url(path)
-                    images.append({
-                        'path': path,
-                        'url': public_url,
-                        'filename': path.split('/')[-1] if '/' in path else path,
-                        'size': file_info.get('metadata', {}).get('size'),
-                        'created_at': file_info.get('created_at')
-                    })
-                except Exception as e:
-                    print(f"[WARN] Failed to get URL for {path}: {e}")
-        
-        return images
+        return list(iter_watchlist_images_for_device(device_id))
     except Exception as e:
         print(f"[ERROR] Failed to get watchlist images: {e}")
         return []
 
-def delete_watchlist_image(device_id: str, image_path: str) -> bool:
-    """Delete watchlist image from Supabase"""
-    # Ensure path includes device_id
+def watchlist_image_path(device_id: str, image_path: str) -> str:
+    """Ensure a watchlist image path includes the device folder"""
     if not image_path.startswith(device_id):
         image_path = f"{device_id}/{image_path}"
-    
-    return delete_file('images', image_path)
\ No newline at end of file
+    return image_path
+
+def delete_watchlist_image(device_id: str, image_path: str) -> bool:
+    """Delete watchlist image from Supabase"""
+    return delete_file('images', watchlist_image_path(device_id, image_path))
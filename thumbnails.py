@@ -0,0 +1,205 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+from config import Config
+from supabase_client import download_file
+from face_detection import run_blocking
+
+THUMB_BUCKETS = {'images', 'captured-faces'}
+THUMB_WIDTHS = (64, 128, 256, 512)
+THUMB_FORMATS = {
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+}
+
+
+class ThumbnailCache:
+    """
+    Size-bounded in-memory LRU of encoded thumbnails backed by a disk cache.
+    The disk cache is bounded too: once it grows past max_disk_bytes, the
+    least recently used files (by mtime, refreshed on every disk hit) are
+    removed until it is back under 90% of the limit.
+    """
+
+    def __init__(self, max_bytes: int, cache_dir: str, max_disk_bytes: int):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        # Unknown until the first write scans the directory
+        self.disk_bytes = None
+        self.disk_lock = threading.Lock()
+
+    def disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                return data
+
+        path = self.disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.put_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        self.put_memory(key, data)
+        path = self.disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARN] Failed to write thumbnail cache: {e}")
+            return
+        self.account_disk(len(data))
+
+    def scan_disk(self):
+        """(mtime, size, path) of every cached file"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def account_disk(self, added: int):
+        with self.disk_lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(size for _, size, _ in self.scan_disk())
+            else:
+                self.disk_bytes += added
+            if self.disk_bytes <= self.max_disk_bytes:
+                return
+
+            # Other workers share the directory, so evict from a fresh scan
+            files = sorted(self.scan_disk())
+            total = sum(size for _, size, _ in files)
+            target = int(self.max_disk_bytes * 0.9)
+            removed = 0
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self.disk_bytes = total
+        if removed:
+            print(f"[INFO] Thumbnail disk cache evicted {removed} file(s)")
+
+    def discard(self, key: str):
+        with self.lock:
+            data = self.entries.pop(key, None)
+            if data is not None:
+                self.total_bytes -= len(data)
+        try:
+            size = os.path.getsize(self.disk_path(key))
+            os.remove(self.disk_path(key))
+        except FileNotFoundError:
+            return
+        with self.disk_lock:
+            if self.disk_bytes is not None:
+                self.disk_bytes -= size
+
+    def put_memory(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= len(self.entries.pop(key))
+            self.entries[key] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                _, old = self.entries.popitem(last=False)
+                self.total_bytes -= len(old)
+
+
+thumbnail_cache = ThumbnailCache(Config.THUMB_MEMORY_CACHE_BYTES, Config.THUMB_CACHE_DIR,
+                                 Config.THUMB_DISK_CACHE_BYTES)
+
+
+def snap_width(width: int) -> int:
+    """Round a requested width up to one of the cached sizes"""
+    for allowed in THUMB_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return THUMB_WIDTHS[-1]
+
+
+def thumbnail_key(bucket: str, path: str, width: int, fmt: str) -> str:
+    return hashlib.sha256(f"{bucket}\0{path}\0{width}\0{fmt}".encode()).hexdigest()
+
+
+def invalidate_thumbnails(bucket: str, paths: List[str]):
+    """Drop every cached size and format of deleted storage objects"""
+    for path in paths:
+        for width in THUMB_WIDTHS:
+            for fmt in THUMB_FORMATS:
+                thumbnail_cache.discard(thumbnail_key(bucket, path, width, fmt))
+
+
+def render_thumbnail(image_bytes: bytes, width: int, fmt: str) -> Optional[bytes]:
+    """Decode, downscale and re-encode an image off the event loop"""
+    return run_blocking(_render_thumbnail, image_bytes, width, fmt)
+
+
+def _render_thumbnail(image_bytes: bytes, width: int, fmt: str) -> Optional[bytes]:
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+
+    h, w = image.shape[:2]
+    if w > width:
+        image = cv2.resize(image, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+
+    ext, _, quality_flag = THUMB_FORMATS[fmt]
+    ok, buf = cv2.imencode(ext, image, [int(quality_flag), Config.THUMB_QUALITY])
+    return buf.tobytes() if ok else None
+
+
+def get_thumbnail(bucket: str, path: str, width: int, fmt: str) -> Optional[Tuple[bytes, str, str]]:
+    """Return (data, mimetype, etag) for a thumbnail, generating it on a cache miss"""
+    width = snap_width(width)
+    key = thumbnail_key(bucket, path, width, fmt)
+
+    data = thumbnail_cache.get(key)
+    if data is None:
+        original = download_file(bucket, path)
+        if original is None:
+            return None
+        data = render_thumbnail(original, width, fmt)
+        if data is None:
+            return None
+        thumbnail_cache.put(key, data)
+
+    etag = hashlib.sha256(data).hexdigest()[:32]
+    return data, THUMB_FORMATS[fmt][1], etag
@@ -0,0 +1,365 @@
+import os
+import uuid
+import queue
+import tarfile
+import zipfile
+import threading
+import mimetypes
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from flask import current_app
+from werkzeug.utils import secure_filename
+from config import Config
+from models import db, WatchlistMember, FaceImage, ImportJob
+from supabase_client import (
+    compute_content_hash,
+    upload_watchlist_images,
+    upload_to_supabase,
+    upload_with_retry,
+    download_file,
+    face_crop_path
+)
+from face_detection import normalize_face
+from watchlist_manifest import record_image_changes, insert_face_images
+
+# Counters a job accumulates; progress lives in the import_job table so any worker can answer a poll
+JOB_COUNTERS = ('total', 'processed', 'uploaded', 'duplicates', 'failed',
+                'members_created', 'faces_queued', 'faces_done')
+MAX_JOB_ERRORS = 50
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Pending (job_id, image_id, storage path) face crops, drained by a background thread
+face_crop_queue = queue.Queue()
+_crop_worker = None
+_crop_worker_lock = threading.Lock()
+
+
+class ArchiveReader:
+    """Entry-by-entry access to a zip or tar archive stored on disk"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if zipfile.is_zipfile(path):
+            self.kind = 'zip'
+        elif tarfile.is_tarfile(path):
+            self.kind = 'tar'
+        else:
+            raise ValueError('Archive must be a zip or tar file')
+
+    def iter_entries(self, read: bool = True) -> Iterator[Tuple[str, str, int, Optional[bytes]]]:
+        """
+        Yield (member_name, filename, size, data) for files laid out as
+        member_name/<image>; the member is the file's parent directory.
+        Only one entry is held in memory at a time, and none with read=False.
+        """
+        if self.kind == 'zip':
+            with zipfile.ZipFile(self.path) as archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        continue
+                    parsed = self.parse_name(info.filename)
+                    if parsed:
+                        data = self.read_limited(archive.open(info), info.file_size) if read else None
+                        yield parsed[0], parsed[1], info.file_size, data
+        else:
+            # Sequential access keeps compressed tars to one decompression pass
+            with tarfile.open(self.path, 'r:*') as archive:
+                for info in archive:
+                    if not info.isfile():
+                        continue
+                    parsed = self.parse_name(info.name)
+                    if parsed:
+                        data = self.read_limited(archive.extractfile(info), info.size) if read else None
+                        yield parsed[0], parsed[1], info.size, data
+
+    @staticmethod
+    def parse_name(name: str) -> Optional[Tuple[str, str]]:
+        parts = [p for p in name.replace('\\', '/').split('/') if p]
+        if len(parts) < 2 or any(p.startswith('.') or p == '__MACOSX' for p in parts):
+            return None
+        member_name = parts[-2].strip()[:100]
+        filename = secure_filename(parts[-1])
+        if not member_name or not filename:
+            return None
+        return member_name, filename
+
+    @staticmethod
+    def read_limited(fileobj, size: int) -> Optional[bytes]:
+        if size > Config.IMPORT_MAX_IMAGE_BYTES:
+            return None
+        with fileobj:
+            return fileobj.read()
+
+
+def _update_job(job_id: str, **changes):
+    """
+    Add to the job's counters and replace its other fields, committing on a
+    connection of its own so progress is visible while the import's session
+    is mid-batch. Needs an app context.
+    """
+    table = ImportJob.__table__
+    errors = changes.pop('errors', None)
+    values = {
+        key: table.c[key] + value if key in JOB_COUNTERS else value
+        for key, value in changes.items()
+    }
+    with db.engine.begin() as conn:
+        if errors:
+            current = conn.execute(
+                db.select(table.c.errors).where(table.c.id == job_id).with_for_update()
+            ).scalar()
+            # Keep the progress payload small on archives with many bad files
+            values['errors'] = ((current or []) + errors)[:MAX_JOB_ERRORS]
+        if values:
+            conn.execute(table.update().where(table.c.id == job_id).values(**values))
+
+
+def serialize_job(job: ImportJob) -> Dict:
+    return {
+        'id': job.id,
+        'archive': job.archive,
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed,
+        'uploaded': job.uploaded,
+        'duplicates': job.duplicates,
+        'failed': job.failed,
+        'membersCreated': job.members_created,
+        'facesQueued': job.faces_queued,
+        'facesDone': job.faces_done,
+        'errors': job.errors or [],
+        'createdAt': job.created_at.isoformat() if job.created_at else None,
+        'finishedAt': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+def get_import_job(job_id: str, user_id: str) -> Optional[Dict]:
+    """Progress snapshot of an import job owned by user_id"""
+    job = ImportJob.query.filter_by(id=job_id, user_id=uuid.UUID(str(user_id))).first()
+    return serialize_job(job) if job else None
+
+
+def _prune_jobs():
+    ImportJob.query.filter(
+        ImportJob.finished_at < db.func.now() - timedelta(seconds=Config.IMPORT_JOB_TTL)
+    ).delete(synchronize_session=False)
+
+
+def _ensure_members(user_id: str, names: List[str]) -> Tuple[Dict[str, uuid.UUID], int]:
+    """Map member names to ids, creating the user's missing members in one commit"""
+    members = dict(
+        WatchlistMember.query.filter(
+            WatchlistMember.user_id == user_id,
+            WatchlistMember.name.in_(names)
+        ).with_entities(WatchlistMember.name, WatchlistMember.id)
+    )
+    created = [
+        WatchlistMember(id=uuid.uuid4(), user_id=user_id, name=name, status='active')
+        for name in names if name not in members
+    ]
+    if created:
+        db.session.add_all(created)
+        db.session.commit()
+        members.update((m.name, m.id) for m in created)
+    return members, len(created)
+
+
+def _import_batch(job_id: str, user_id: str, device_id: str,
+                  members: Dict[str, uuid.UUID], batch: List[Dict]):
+    """Deduplicate, upload and record one batch of archive entries"""
+    hashes = [item['content_hash'] for item in batch]
+    member_ids = {members[item['member']] for item in batch}
+    known = {
+        (img.member_id, img.content_hash)
+        for img in FaceImage.query.filter(
+            FaceImage.member_id.in_(member_ids),
+            FaceImage.content_hash.in_(hashes)
+        ).with_entities(FaceImage.member_id, FaceImage.content_hash)
+    }
+
+    by_member = {}
+    duplicates = 0
+    for item in batch:
+        key = (members[item['member']], item['content_hash'])
+        if key in known:
+            duplicates += 1
+            continue
+        known.add(key)
+        by_member.setdefault(item['member'], []).append(item)
+
+    images = []
+    errors = []
+    for name, items in by_member.items():
+        member_id = members[name]
+        results = upload_watchlist_images(
+            user_id=user_id,
+            device_id=device_id,
+            watchlist_id=str(member_id),
+            watchlist_name=name,
+            files=items
+        )
+        for item in results:
+            upload_result = item.get('result') or {}
+            if not upload_result.get('success'):
+                errors.append({'member': name, 'filename': item['filename'],
+                               'error': item.get('error', 'Upload failed')})
+                continue
+            images.append(FaceImage(
+                id=uuid.uuid4(),
+                member_id=member_id,
+                filename=item['filename'],
+                supabase_path=upload_result.get('path'),
+                path=upload_result.get('public_url') or upload_result.get('signed_url', ''),
+                content_hash=upload_result.get('content_hash'),
+                size=upload_result.get('size'),
+                uploaded_at=datetime.utcnow()
+            ))
+
+    # Bytes a concurrent upload already added for the member reuse that row
+    existing_ids = insert_face_images(images)
+    db.session.commit()
+    duplicates += len(existing_ids)
+    images = [img for img in images if img.id not in existing_ids]
+
+    if Config.FACE_CROP_ENABLED and images:
+        for img in images:
+            enqueue_face_crop(job_id, img.id, img.supabase_path)
+    _update_job(job_id, processed=len(batch), uploaded=len(images), duplicates=duplicates,
+                failed=len(errors), faces_queued=len(images) if Config.FACE_CROP_ENABLED else 0,
+                errors=errors)
+
+
+def _run_import(app, job_id: str, archive_path: str, user_id: str, device_id: str,
+                accept_filename: Callable[[str], bool]):
+    with app.app_context():
+        try:
+            _update_job(job_id, status='running')
+            reader = ArchiveReader(archive_path)
+
+            # First pass reads headers only, to size the job and create members up front
+            names = []
+            total = 0
+            for member_name, _, _, _ in reader.iter_entries(read=False):
+                total += 1
+                if member_name not in names:
+                    names.append(member_name)
+            _update_job(job_id, total=total)
+
+            members, created = _ensure_members(user_id, names) if names else ({}, 0)
+            _update_job(job_id, members_created=created)
+
+            batch = []
+            for member_name, filename, _, data in reader.iter_entries():
+                if data is None:
+                    _update_job(job_id, processed=1, failed=1, errors=[{
+                        'member': member_name, 'filename': filename, 'error': 'File too large'
+                    }])
+                    continue
+                if not accept_filename(filename):
+                    _update_job(job_id, processed=1, failed=1, errors=[{
+                        'member': member_name, 'filename': filename, 'error': 'File type not allowed'
+                    }])
+                    continue
+                batch.append({
+                    'member': member_name,
+                    'filename': filename,
+                    'file_bytes': data,
+                    'content_type': mimetypes.guess_type(filename)[0] or 'image/jpeg',
+                    'content_hash': compute_content_hash(data)
+                })
+                if len(batch) >= Config.IMPORT_BATCH_SIZE:
+                    _import_batch(job_id, user_id, device_id, members, batch)
+                    batch = []
+            if batch:
+                _import_batch(job_id, user_id, device_id, members, batch)
+
+            _update_job(job_id, status='completed', finished_at=db.func.now())
+        except Exception as e:
+            print(f"[ERROR] Watchlist import {job_id} failed: {e}")
+            db.session.rollback()
+            try:
+                _update_job(job_id, status='failed', finished_at=db.func.now(),
+                            errors=[{'error': str(e)}])
+            except Exception as update_error:
+                print(f"[ERROR] Failed to record import {job_id} failure: {update_error}")
+        finally:
+            try:
+                os.remove(archive_path)
+            except OSError:
+                pass
+
+
+def start_import(app, archive_path: str, archive_name: str, user_id: str, device_id: str,
+                 accept_filename: Callable[[str], bool]) -> Dict:
+    """
+    Queue an archive already saved to archive_path for import and return the
+    job's initial progress. Entries rejected by accept_filename are reported
+    as failed. The archive file is removed once the job ends.
+    """
+    global _executor
+    ArchiveReader(archive_path)
+    _prune_jobs()
+
+    job = ImportJob(
+        id=uuid.uuid4().hex,
+        user_id=uuid.UUID(str(user_id)),
+        archive=archive_name,
+        status='queued',
+        errors=[]
+    )
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+    progress = serialize_job(job)
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.IMPORT_WORKERS, thread_name_prefix='watchlist-import')
+        _executor.submit(_run_import, app, job_id, archive_path, str(user_id), device_id,
+                         accept_filename)
+    return progress
+
+
+def _face_crop_worker(app):
+    while True:
+        job_id, image_id, path = face_crop_queue.get()
+        with app.app_context():
+            try:
+                image_bytes = download_file('images', path)
+                derived = normalize_face(image_bytes) if image_bytes else None
+                if derived:
+                    crop_bytes, crop_box = derived
+                    crop = upload_with_retry(
+                        upload_to_supabase, 'images', face_crop_path(path),
+                        crop_bytes, 'image/jpeg', allow_existing=True
+                    )
+                    image = FaceImage.query.get(image_id)
+                    if image is not None:
+                        image.face_path = crop['path']
+                        image.face_box = crop_box
+                        record_image_changes([image])
+                        db.session.commit()
+            except Exception as e:
+                print(f"[WARN] Face normalization failed for {path}: {e}")
+                db.session.rollback()
+            finally:
+                try:
+                    _update_job(job_id, faces_done=1)
+                except Exception as e:
+                    print(f"[WARN] Failed to update import {job_id} progress: {e}")
+                face_crop_queue.task_done()
+
+
+def enqueue_face_crop(job_id: str, image_id, path: str, app=None):
+    """Derive the normalized face crop of a stored image in the background"""
+    global _crop_worker
+    app = app or current_app._get_current_object()
+    with _crop_worker_lock:
+        if _crop_worker is None or not _crop_worker.is_alive():
+            _crop_worker = threading.Thread(target=_face_crop_worker, args=(app,),
+                                            name='face-crop', daemon=True)
+            _crop_worker.start()
+    face_crop_queue.put((job_id, image_id, path))
@@ -0,0 +1,169 @@
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import db, Device, WatchlistMember, FaceImage, WatchlistChange
+from supabase_client import build_public_url
+
+MANIFEST_FIELDS = ('id', 'member_id', 'supabase_path', 'face_path', 'content_hash', 'size')
+FACE_IMAGE_COLUMNS = ('id', 'member_id', 'filename', 'supabase_path', 'path', 'content_hash',
+                      'face_path', 'face_box', 'size', 'uploaded_at')
+
+
+def _image_fields(image) -> Dict:
+    if isinstance(image, dict):
+        return {field: image.get(field) for field in MANIFEST_FIELDS}
+    return {field: getattr(image, field, None) for field in MANIFEST_FIELDS}
+
+
+def _path_device_id(path: Optional[str]) -> Optional[uuid.UUID]:
+    # Watchlist objects live under deviceID/
+    try:
+        return uuid.UUID(path.split('/', 1)[0]) if path and '/' in path else None
+    except ValueError:
+        return None
+
+
+def record_image_changes(images: Iterable, op: str = 'upsert'):
+    """
+    Append change rows for FaceImage rows (or dicts with the same keys) to the
+    caller's transaction. The device comes from each image's storage path.
+    Each device row is locked until commit so versions of one device become
+    visible in order.
+    """
+    changes = []
+    for image in images:
+        fields = _image_fields(image)
+        device_id = _path_device_id(fields['supabase_path'])
+        if device_id is None or fields['id'] is None:
+            continue
+        changes.append(WatchlistChange(
+            device_id=device_id,
+            image_id=fields['id'],
+            member_id=fields['member_id'],
+            op=op,
+            supabase_path=fields['supabase_path'],
+            face_path=fields['face_path'],
+            content_hash=fields['content_hash'],
+            size=fields['size']
+        ))
+    if not changes:
+        return
+
+    for device_id in sorted({c.device_id for c in changes}, key=str):
+        db.session.query(Device.id).filter_by(id=device_id).with_for_update().first()
+    db.session.add_all(changes)
+
+
+def insert_face_images(images: List) -> Dict[uuid.UUID, Optional[uuid.UUID]]:
+    """
+    Insert FaceImage rows (or dicts with the same keys) and record their
+    changes, in the caller's transaction. A member has one row per content
+    hash: an image whose bytes the member already has is not inserted, and
+    the result maps its id to the id of the row that has them.
+    """
+    if not images:
+        return {}
+
+    rows = []
+    for image in images:
+        values = image if isinstance(image, dict) else {c: getattr(image, c, None) for c in FACE_IMAGE_COLUMNS}
+        row = {c: values.get(c) for c in FACE_IMAGE_COLUMNS}
+        row['uploaded_at'] = row['uploaded_at'] or datetime.utcnow()
+        rows.append({c: db.null() if v is None else v for c, v in row.items()})
+    inserted = set(db.session.scalars(
+        pg_insert(FaceImage).values(rows).on_conflict_do_nothing(
+            index_elements=['member_id', 'content_hash']
+        ).returning(FaceImage.id)
+    ))
+    record_image_changes([image for image in images if _image_fields(image)['id'] in inserted])
+
+    skipped = [_image_fields(image) for image in images if _image_fields(image)['id'] not in inserted]
+    if not skipped:
+        return {}
+    existing = {
+        (member_id, content_hash): image_id
+        for image_id, member_id, content_hash in db.session.query(
+            FaceImage.id, FaceImage.member_id, FaceImage.content_hash
+        ).filter(
+            FaceImage.member_id.in_({f['member_id'] for f in skipped}),
+            FaceImage.content_hash.in_({f['content_hash'] for f in skipped})
+        )
+    }
+    return {f['id']: existing.get((f['member_id'], f['content_hash'])) for f in skipped}
+
+
+def current_version(device_id) -> int:
+    """Latest change id recorded for a device, 0 before the first change"""
+    return db.session.query(db.func.max(WatchlistChange.id)).filter(
+        WatchlistChange.device_id == device_id
+    ).scalar() or 0
+
+
+def _manifest_entry(fields: Dict) -> Dict:
+    return {
+        'id': str(fields['id']),
+        'memberId': str(fields['member_id']) if fields['member_id'] else None,
+        'path': fields['supabase_path'],
+        'url': build_public_url('images', fields['supabase_path']),
+        'facePath': fields['face_path'],
+        'faceUrl': build_public_url('images', fields['face_path']) if fields['face_path'] else None,
+        'contentHash': fields['content_hash'],
+        'size': fields['size']
+    }
+
+
+def build_manifest(device_id, owner_id, since: int = None) -> Dict:
+    """
+    Images a device should hold. Without since (or with a version the server
+    never issued) the full set is returned; otherwise only images changed or
+    deleted after that version, each image reported once in its latest state.
+    """
+    version = current_version(device_id)
+
+    if since is not None and since <= version:
+        latest = {}
+        for change in WatchlistChange.query.filter(
+            WatchlistChange.device_id == device_id,
+            WatchlistChange.id > since
+        ).order_by(WatchlistChange.id):
+            latest[change.image_id] = change
+            version = max(version, change.id)
+
+        images: List[Dict] = []
+        deleted: List[str] = []
+        for image_id, change in latest.items():
+            if change.op == 'delete':
+                deleted.append(str(image_id))
+            else:
+                images.append(_manifest_entry({
+                    'id': image_id,
+                    'member_id': change.member_id,
+                    'supabase_path': change.supabase_path,
+                    'face_path': change.face_path,
+                    'content_hash': change.content_hash,
+                    'size': change.size
+                }))
+        return {
+            'deviceId': str(device_id),
+            'version': version,
+            'since': since,
+            'full': False,
+            'images': images,
+            'deleted': deleted
+        }
+
+    rows = db.session.query(
+        *(getattr(FaceImage, field) for field in MANIFEST_FIELDS)
+    ).join(WatchlistMember).filter(
+        WatchlistMember.user_id == owner_id,
+        FaceImage.supabase_path.like(f"{device_id}/%")
+    )
+    return {
+        'deviceId': str(device_id),
+        'version': version,
+        'since': None,
+        'full': True,
+        'images': [_manifest_entry(dict(zip(MANIFEST_FIELDS, row))) for row in rows],
+        'deleted': []
+    }